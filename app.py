@@ -1,28 +1,193 @@
+import os
+import click
 from flask import Flask
-from models import db
-from routes import main
+from flask.cli import with_appcontext
+from models import db, Tournament, Player, PlayerProfile, upgrade_schema, configure_sqlite
+from routes import main, freeze_finished_tournaments
+from utils import rebuild_standings, rebuild_counters, rebuild_ratings, index_profile_names, bump_revision
+from cache import page_cache, fragment_cache
+from events import broadcaster
+from profiling import init_profiling
+from archive import export_ndjson, import_ndjson
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tournament.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+DEFAULT_CONFIG = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///tournament.db',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 30},
+    'SQLITE_WAL': True,
+    'SQLITE_BUSY_TIMEOUT_MS': 15000,
+    'PROFILING': False, # Server-Timing header and /metrics, for diagnosing slow pages
+    'PAGE_CACHE_SIZE': 64, # Rendered tournament pages kept in memory (LRU)
+    'FRAGMENT_CACHE_SIZE': 4096, # Rendered match cards, rounds and standings tables (LRU)
+    'TOURNAMENTS_PER_PAGE': 25, # Start page: tournaments per page of the list
+    'PLAYER_SUGGESTIONS': 12, # Start page: known players shown and returned per search
+    'SSE_QUEUE_SIZE': 50, # Pending live events per connected display
+    'SSE_HEARTBEAT_SECONDS': 15,
+    'SSE_POLL_SECONDS': 2, # Revision check for changes made by other processes
+    'HOST': '0.0.0.0',
+    'PORT': 5123,
+    'WORKERS': min(4, os.cpu_count() or 1), # serve.py: worker processes
+    'THREADS': 16, # serve.py: threads per worker, every open live display holds one
+    'OUTBUF_OVERFLOW': 16 * 1024 * 1024, # serve.py: larger responses are buffered in a temp file
+}
 
-db.init_app(app)
+def create_app(config=None):
+    """
+    Application factory. Settings come from DEFAULT_CONFIG, then from environment
+    variables with the ADARTS_ prefix (e.g. ADARTS_PORT=8000, ADARTS_PROFILING=true,
+    ADARTS_SQLALCHEMY_DATABASE_URI=sqlite:////srv/adarts/tournament.db), then from `config`.
+    The schema is not touched here, see init_database().
+    """
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.from_prefixed_env('ADARTS')
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine, wal=app.config['SQLITE_WAL'], busy_timeout_ms=app.config['SQLITE_BUSY_TIMEOUT_MS'])
+        init_profiling(app, db.engine)
+    page_cache.maxsize = app.config['PAGE_CACHE_SIZE']
+    fragment_cache.maxsize = app.config['FRAGMENT_CACHE_SIZE']
+    broadcaster.queue_size = app.config['SSE_QUEUE_SIZE']
+
+    # Register the blueprint
+    app.register_blueprint(main)
+    app.after_request(add_header)
 
-# Register the blueprint
-app.register_blueprint(main)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(rebuild_standings_command)
+    app.cli.add_command(check_counters_command)
+    app.cli.add_command(rebuild_ratings_command)
+    app.cli.add_command(freeze_tournaments_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(import_command)
+    return app
+
+def init_database(app):
+    """Creates missing tables, columns and indexes. Run once per start, not per worker."""
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        if PlayerProfile.query.first() is None and Player.query.first() is not None:
+            # Database from before player profiles existed
+            rebuild_ratings()
+            db.session.commit()
+        if PlayerProfile.query.filter(PlayerProfile.search_name == None).first() is not None:
+            # Profiles from before the name search existed
+            index_profile_names()
+            db.session.commit()
+        # Finished tournaments from before frozen pages existed, or imported ones
+        if freeze_finished_tournaments():
+            db.session.commit()
 
-@app.after_request
 def add_header(response):
     """
-    Add headers to both force latest IE rendering engine or Chrome Frame,
-    and also to cache the rendered page for 10 minutes.
+    Disable browser caching, except for responses carrying an ETag:
+    those may be stored but have to be revalidated on every request (cheap 304s).
     """
+    if response.get_etag()[0]:
+        response.headers["Cache-Control"] = "no-cache"
+        return response
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
     return response
 
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create or upgrade the database schema."""
+    db.create_all()
+    upgrade_schema()
+    click.echo('Datenbank ist auf dem aktuellen Stand.')
+
+@click.command('rebuild-standings')
+@click.option('--tournament-id', type=int, default=None, help='Only rebuild this tournament.')
+@with_appcontext
+def rebuild_standings_command(tournament_id):
+    """Recompute the persisted standings from the match results."""
+    query = Tournament.query
+    if tournament_id is not None:
+        query = query.filter_by(id=tournament_id)
+    count = 0
+    for tournament in query.all():
+        rebuild_standings(tournament.id)
+        bump_revision(tournament.id)
+        count += 1
+    db.session.commit()
+    # The new revision outdates the frozen pages of finished tournaments
+    freeze_finished_tournaments()
+    db.session.commit()
+    click.echo(f'Tabelle für {count} Turnier(e) neu berechnet.')
+
+@click.command('check-counters')
+@click.option('--fix', is_flag=True, help='Store the recomputed counters.')
+@with_appcontext
+def check_counters_command(fix):
+    """Compare the stored match counters with a fresh count."""
+    mismatches = 0
+    for tournament in Tournament.query.all():
+        stored = (tournament.total_matches, tournament.completed_matches)
+        counted = rebuild_counters(tournament.id)
+        if stored != counted:
+            mismatches += 1
+            click.echo(f'{tournament.name} (#{tournament.id}): gespeichert {stored[1]}/{stored[0]}, gezählt {counted[1]}/{counted[0]}')
+            bump_revision(tournament.id)
+    if fix:
+        db.session.commit()
+        freeze_finished_tournaments()
+        db.session.commit()
+        click.echo(f'{mismatches} Turnier(e) korrigiert.')
+    else:
+        db.session.rollback()
+        click.echo(f'{mismatches} Abweichung(en) gefunden.' + (' Mit --fix korrigieren.' if mismatches else ''))
+
+@click.command('rebuild-ratings')
+@with_appcontext
+def rebuild_ratings_command():
+    """Link all players to their profiles and recompute ratings and lifetime stats."""
+    counted = rebuild_ratings()
+    db.session.commit()
+    click.echo(f'Rangliste aus {counted} Spiel(en) neu berechnet.')
+
+@click.command('freeze-tournaments')
+@with_appcontext
+def freeze_tournaments_command():
+    """Store the final page of every finished tournament that has none or an outdated one."""
+    count = freeze_finished_tournaments()
+    db.session.commit()
+    click.echo(f'{count} beendete(s) Turnier(e) eingefroren.')
+
+@click.command('export')
+@click.argument('output', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--tournament-id', type=int, multiple=True, help='Only export these tournaments.')
+@with_appcontext
+def export_command(output, tournament_id):
+    """Write all tournaments as NDJSON to OUTPUT (default: stdout)."""
+    for line in export_ndjson(list(tournament_id) or None):
+        output.write(line)
+
+@click.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--batch-size', type=int, default=2000, show_default=True, help='Rows per insert statement.')
+@with_appcontext
+def import_command(source, batch_size):
+    """Add the tournaments of an NDJSON export to the database."""
+    try:
+        counts = import_ndjson(source, batch_size=batch_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    # Ratings depend on the order of all results, old and imported ones
+    rebuild_ratings()
+    freeze_finished_tournaments()
+    db.session.commit()
+    click.echo('Importiert: %d Turnier(e), %d Spieler, %d Spiele, %d Tabelleneinträge.' % (
+        counts['tournament'], counts['player'], counts['match'], counts['standing']))
+
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    app.run(debug=True, host='0.0.0.0', port=5123)
+    # Development server, for events use serve.py
+    app = create_app()
+    init_database(app)
+    app.run(debug=True, host=app.config['HOST'], port=app.config['PORT'])
@@ -0,0 +1,192 @@
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import select, insert, func
+from models import db, Tournament, Player, Match, Standing
+from snapshot import load_tournament_snapshot
+from utils import rank_standings
+
+# Export order: every record only references records written before it (or, for the
+# bracket links between matches, records of the same tournament)
+ARCHIVE_MODELS = {'tournament': Tournament, 'player': Player, 'match': Match, 'standing': Standing}
+
+# Foreign key columns and the table whose IDs they hold
+REFERENCES = {
+    'tournament': {'id': 'tournament'},
+    'player': {'id': 'player', 'tournament_id': 'tournament'},
+    'match': {'id': 'match', 'tournament_id': 'tournament', 'player1_id': 'player', 'player2_id': 'player',
+              'next_match_id': 'match', 'loser_next_match_id': 'match'},
+    'standing': {'id': 'standing', 'tournament_id': 'tournament', 'player_id': 'player'},
+}
+
+# Columns every record of a kind needs
+REQUIRED = {
+    'tournament': ('id', 'name'),
+    'player': ('id', 'tournament_id', 'name'),
+    'match': ('id', 'tournament_id'),
+    'standing': ('id', 'tournament_id', 'player_id'),
+}
+
+# Further integer columns (besides the REFERENCES)
+INTEGER_COLUMNS = ('score_player1', 'score_player2', 'round_number', 'next_match_slot', 'loser_next_match_slot',
+                   'points', 'wins', 'losses', 'draws', 'legs_won', 'legs_lost', 'open_matches')
+
+# Columns that only make sense in the database they were written in
+LOCAL_COLUMNS = ('profile_id', 'rating_change')
+
+def _rows(model, tournament_id, yield_per=1000):
+    """Rows of one table for one tournament as dicts, fetched in chunks."""
+    table = model.__table__
+    column = table.c.id if model is Tournament else table.c.tournament_id
+    result = db.session.execute(select(table).where(column == tournament_id).order_by(table.c.id)
+                                .execution_options(yield_per=yield_per))
+    for row in result.mappings():
+        yield dict(row)
+
+def _final_ranks(tournament_id):
+    """{player_id: rank} as shown on the tournament page."""
+    snapshot = load_tournament_snapshot(tournament_id)
+    standings = rank_standings(snapshot.tournament.mode, snapshot.player_stats, snapshot.matches)
+    return {row['player'].id: rank for rank, row in enumerate(standings, start=1)}
+
+def _table_rows(model, tournament_ids=None, yield_per=1000):
+    """Rows of one table for the given tournaments (None for all) as dicts, in export order, fetched in chunks."""
+    table = model.__table__
+    column = table.c.id if model is Tournament else table.c.tournament_id
+    order = (table.c.id,) if model is Tournament else (column, table.c.id)
+    query = select(table).order_by(*order).execution_options(yield_per=yield_per)
+    if tournament_ids is not None:
+        query = query.where(column.in_(tournament_ids))
+    for row in db.session.execute(query).mappings():
+        yield dict(row)
+
+def iter_records(tournament_ids=None, kinds=tuple(ARCHIVE_MODELS)):
+    """
+    Yields (kind, row) for all tournaments, one tournament at a time: the tournament,
+    its players, matches and standings (with the final rank), limited to the given kinds.
+    Only the current tournament is held in memory, so the size of the archive does not matter.
+    """
+    if tournament_ids is None:
+        tournament_ids = db.session.execute(select(Tournament.id).order_by(Tournament.id)).scalars().all()
+    for tournament_id in tournament_ids:
+        ranks = _final_ranks(tournament_id) if 'standing' in kinds else {}
+        for kind, model in ARCHIVE_MODELS.items():
+            if kind not in kinds:
+                continue
+            for row in _rows(model, tournament_id):
+                if kind == 'standing':
+                    row['rank'] = ranks.get(row['player_id'])
+                yield kind, row
+        # Nothing of this tournament is needed any more
+        db.session.expunge_all()
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError('Not serializable: %r' % type(value))
+
+def export_ndjson(tournament_ids=None):
+    """Generator of NDJSON lines, one record per line with its kind in 'type'."""
+    for kind, row in iter_records(tournament_ids):
+        yield json.dumps(dict(row, type=kind), default=_json_default, ensure_ascii=False) + '\n'
+
+def csv_columns(kind):
+    columns = [column.name for column in ARCHIVE_MODELS[kind].__table__.columns]
+    return columns + ['rank'] if kind == 'standing' else columns
+
+def export_csv(kind, tournament_ids=None):
+    """
+    Generator of CSV lines (header first) for one kind of record. Only that table is read,
+    the final ranks are only computed for standings.
+    """
+    columns = csv_columns(kind)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield line(columns)
+    if kind == 'standing':
+        # The rank is computed per tournament
+        rows = (row for _, row in iter_records(tournament_ids, kinds=('standing',)))
+    else:
+        rows = _table_rows(ARCHIVE_MODELS[kind], tournament_ids)
+    for row in rows:
+        yield line(['' if row.get(column) is None else row[column] for column in columns])
+
+def _id_offsets():
+    """
+    Shift for the IDs of every table: imported IDs are moved above the highest existing
+    ID, so links between imported records stay valid without an old->new lookup table.
+    """
+    return {kind: db.session.query(func.max(model.id)).scalar() or 0 for kind, model in ARCHIVE_MODELS.items()}
+
+def _check_record(kind, row, number):
+    """Raises ValueError if a record lacks a required column or has a non-integer ID or score."""
+    missing = [name for name in REQUIRED[kind] if row.get(name) is None]
+    if missing:
+        raise ValueError('Zeile %d: %s fehlt.' % (number, ', '.join(missing)))
+    for name in list(REFERENCES[kind]) + [name for name in INTEGER_COLUMNS if name in row]:
+        value = row.get(name)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+            raise ValueError('Zeile %d: %s muss eine ganze Zahl sein, nicht %r.' % (number, name, value))
+
+def import_ndjson(lines, batch_size=2000):
+    """
+    Restores an NDJSON export into the current database, next to the existing tournaments.
+    Records are inserted with executemany batches of batch_size rows per table, all in one
+    transaction. Returns the number of imported records per kind. Raises ValueError for
+    malformed input, nothing is stored in that case.
+    """
+    offsets = _id_offsets()
+    columns = {kind: {column.name: column for column in model.__table__.columns} for kind, model in ARCHIVE_MODELS.items()}
+    batches = {kind: [] for kind in ARCHIVE_MODELS}
+    counts = dict.fromkeys(ARCHIVE_MODELS, 0)
+
+    def flush():
+        # In export order, so referenced rows are always stored first
+        for kind, model in ARCHIVE_MODELS.items():
+            if batches[kind]:
+                db.session.execute(insert(model), batches[kind])
+                counts[kind] += len(batches[kind])
+                batches[kind] = []
+
+    try:
+        for number, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                kind = record.pop('type')
+            except (ValueError, KeyError, AttributeError, TypeError):
+                raise ValueError('Zeile %d ist kein gültiger Datensatz.' % number)
+            if not isinstance(kind, str) or kind not in ARCHIVE_MODELS:
+                raise ValueError('Zeile %d: unbekannter Typ %r.' % (number, kind))
+
+            # Profiles are not part of the archive, they are rebuilt from the names (see rebuild_ratings)
+            row = {name: value for name, value in record.items() if name in columns[kind] and name not in LOCAL_COLUMNS}
+            _check_record(kind, row, number)
+            for name, target in REFERENCES[kind].items():
+                if row.get(name) is not None:
+                    row[name] += offsets[target]
+            if isinstance(row.get('date_created'), str):
+                try:
+                    row['date_created'] = datetime.fromisoformat(row['date_created'])
+                except ValueError:
+                    raise ValueError('Zeile %d: ungültiges Datum %r.' % (number, row['date_created']))
+            batches[kind].append(row)
+            if len(batches[kind]) >= batch_size:
+                flush()
+        flush()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return counts
@@ -0,0 +1,484 @@
+"""
+Benchmarks for the tournament manager.
+
+All benchmarks run against a temporary SQLite file, the real tournament.db is never touched.
+
+    python benchmark.py schedule                 # round robin creation time
+    python benchmark.py schedule --sizes 10 500
+    python benchmark.py schedule --mode knockout --sizes 64 128 256
+    python benchmark.py schedule --mode double_elimination --sizes 64 128
+    python benchmark.py pairing --sizes 80 256    # Swiss pairing engine, all rounds of a simulated event
+    python benchmark.py concurrency --workers 8  # parallel score entry, default vs. tuned SQLite
+    python benchmark.py serving --clients 16     # HTTP throughput, dev server vs. serve.py
+    python benchmark.py scale --json new.json    # create/view/score for 8..512 players
+    python benchmark.py compare old.json new.json
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import tracemalloc
+from datetime import datetime
+
+import sqlalchemy
+from flask import Flask
+from sqlalchemy import event
+from cache import page_cache
+from models import db, Tournament, Player, Match, configure_sqlite
+from routes import main as main_blueprint
+from swiss import pair_swiss_round, default_swiss_rounds
+from utils import generate_round_robin_schedule, generate_knockout_schedule, generate_double_elimination_schedule, rebuild_standings
+
+def make_app(db_path, tuned=True, create=True):
+    """App bound to a throwaway database file. tuned=False keeps SQLite's defaults."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if tuned:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 30}
+    db.init_app(app)
+    app.register_blueprint(main_blueprint)
+    with app.app_context():
+        if tuned:
+            configure_sqlite(db.engine)
+        if create:
+            db.create_all()
+    return app
+
+def create_players(tournament_id, n_players):
+    players = [Player(name='Spieler %d' % i, tournament_id=tournament_id) for i in range(1, n_players + 1)]
+    db.session.add_all(players)
+    db.session.commit()
+    return players
+
+def bench_schedule(mode, sizes, repeat):
+    """Times schedule generation (including the initial standings build)."""
+    generate = {'knockout': generate_knockout_schedule, 'double_elimination': generate_double_elimination_schedule,
+                'round_robin': generate_round_robin_schedule}[mode]
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        print('%8s %10s %12s %12s' % ('Spieler', 'Spiele', 'Schedule ms', 'Gesamt ms'))
+        with app.app_context():
+            for n_players in sizes:
+                best_schedule = best_total = None
+                for _ in range(repeat):
+                    tournament = Tournament(name='Bench %d' % n_players, mode=mode)
+                    db.session.add(tournament)
+                    db.session.commit()
+                    players = create_players(tournament.id, n_players)
+
+                    start = time.perf_counter()
+                    generate(tournament.id, players)
+                    scheduled = time.perf_counter()
+                    rebuild_standings(tournament.id)
+                    db.session.commit()
+                    done = time.perf_counter()
+
+                    schedule_ms = (scheduled - start) * 1000
+                    total_ms = (done - start) * 1000
+                    best_schedule = schedule_ms if best_schedule is None else min(best_schedule, schedule_ms)
+                    best_total = total_ms if best_total is None else min(best_total, total_ms)
+
+                n_matches = Match.query.filter_by(tournament_id=tournament.id).count()
+                print('%8d %10d %12.1f %12.1f' % (n_players, n_matches, best_schedule, best_total))
+
+def bench_pairing(sizes, seed):
+    """Pairs every round of simulated Swiss events with random results, without a database."""
+    print('%8s %8s %12s %12s %10s' % ('Spieler', 'Runden', 'Median ms', 'Max ms', 'Rematches'))
+    for n_players in sizes:
+        rng = random.Random(seed)
+        player_ids = list(range(1, n_players + 1))
+        points = dict.fromkeys(player_ids, 0)
+        played = set()
+        byes = set()
+        timings = []
+        rematches = 0
+        n_rounds = default_swiss_rounds(n_players)
+        for _ in range(n_rounds):
+            ranked_ids = sorted(player_ids, key=lambda player_id: (-points[player_id], player_id))
+            start = time.perf_counter()
+            pairs, bye_id = pair_swiss_round(ranked_ids, points, played, byes)
+            timings.append((time.perf_counter() - start) * 1000)
+            for pair in pairs:
+                pair_key = frozenset(pair)
+                rematches += pair_key in played
+                played.add(pair_key)
+                points[rng.choice(pair)] += 2
+            if bye_id is not None:
+                byes.add(bye_id)
+        print('%8d %8d %12.2f %12.2f %10d' % (n_players, n_rounds, statistics.median(timings), max(timings), rematches))
+
+def _score_worker(args):
+    """Runs in its own process, like one scoring tablet. Returns (ok, failed, latencies in ms)."""
+    db_path, tuned, match_ids = args
+    app = make_app(db_path, tuned=tuned, create=False)
+    client = app.test_client()
+    ok = failed = 0
+    latencies = []
+    for match_id in match_ids:
+        start = time.perf_counter()
+        try:
+            response = client.post('/update_score/%d' % match_id, data={'score_player1': 3, 'score_player2': 1})
+            success = response.status_code == 302
+        except Exception:
+            success = False
+        latencies.append((time.perf_counter() - start) * 1000)
+        if success:
+            ok += 1
+        else:
+            failed += 1
+    return ok, failed, latencies
+
+def bench_concurrency(workers, players):
+    """Several processes enter scores into the same database at the same time."""
+    print('%-10s %8s %8s %10s %10s %10s' % ('SQLite', 'OK', 'Fehler', 'Req/s', 'p50 ms', 'p95 ms'))
+    for tuned in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'bench.db')
+            app = make_app(db_path, tuned=tuned)
+            client = app.test_client()
+            client.post('/create_tournament', data={
+                'tournament_name': 'Bench', 'tournament_mode': 'round_robin',
+                'player_names': '\n'.join('Spieler %d' % i for i in range(1, players + 1))})
+            with app.app_context():
+                match_ids = [m.id for m in Match.query.filter(Match.player2_id != None)]
+                db.engine.dispose()
+
+            chunks = [(db_path, tuned, match_ids[i::workers]) for i in range(workers)]
+            start = time.perf_counter()
+            with multiprocessing.Pool(workers) as pool:
+                results = pool.map(_score_worker, chunks)
+            elapsed = time.perf_counter() - start
+
+            ok = sum(r[0] for r in results)
+            failed = sum(r[1] for r in results)
+            latencies = sorted(l for r in results for l in r[2])
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print('%-10s %8d %8d %10.1f %10.1f %10.1f' % (
+                'WAL' if tuned else 'Standard', ok, failed, ok / elapsed, statistics.median(latencies), p95))
+
+DEV_SERVER = ('from app import create_app; app = create_app(); '
+              'app.run(debug=True, use_reloader=False, host="127.0.0.1", port=app.config["PORT"])')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_server(base_url, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/', timeout=1).read()
+            return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    return False
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+def _load_client(base_url, tournament_id, match_ids, deadline, rng, results):
+    """One browser/tablet: mostly page views, every tenth request a score entry."""
+    opener = urllib.request.build_opener(_NoRedirect)
+    while time.time() < deadline:
+        roll = rng.random()
+        start = time.perf_counter()
+        try:
+            if roll < 0.1:
+                data = urllib.parse.urlencode({'score_player1': rng.randint(0, 3), 'score_player2': 3}).encode()
+                try:
+                    opener.open(base_url + '/update_score/%d' % rng.choice(match_ids), data=data, timeout=30).read()
+                except urllib.error.HTTPError as e:
+                    if e.code != 302:
+                        raise
+            elif roll < 0.2:
+                opener.open(base_url + '/', timeout=30).read()
+            else:
+                opener.open(base_url + '/tournament/%d' % tournament_id, timeout=30).read()
+            results.append((time.perf_counter() - start) * 1000)
+        except Exception:
+            results.append(None)
+
+def bench_serving(clients, seconds, players, workers, threads):
+    """Real HTTP load against the development server and the production entry point."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.db')
+        app = make_app(template)
+        client = app.test_client()
+        client.post('/create_tournament', data={
+            'tournament_name': 'Bench', 'tournament_mode': 'round_robin',
+            'player_names': '\n'.join('Spieler %d' % i for i in range(1, players + 1))})
+        with app.app_context():
+            tournament_id = Tournament.query.first().id
+            match_ids = [m.id for m in Match.query.filter(Match.player2_id != None)]
+            # Closing every connection checkpoints the WAL, the file can be copied afterwards
+            db.session.remove()
+            db.engine.dispose()
+
+        servers = [
+            ('Dev-Server', [sys.executable, '-c', DEV_SERVER], {}),
+            ('serve.py', [sys.executable, os.path.join(root, 'serve.py')],
+             {'ADARTS_WORKERS': str(workers), 'ADARTS_THREADS': str(threads)}),
+        ]
+        print('%d Clients, %d s, Round Robin mit %d Spielern' % (clients, seconds, players))
+        print('%-12s %10s %8s %10s %10s %10s' % ('Server', 'Requests', 'Fehler', 'Req/s', 'p50 ms', 'p95 ms'))
+        for label, command, extra_env in servers:
+            db_path = os.path.join(tmp, 'serve.db')
+            shutil.copy(template, db_path)
+            port = free_port()
+            env = dict(os.environ, ADARTS_SQLALCHEMY_DATABASE_URI='sqlite:///' + db_path, ADARTS_PORT=str(port), **extra_env)
+            process = subprocess.Popen(command, cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                base_url = 'http://127.0.0.1:%d' % port
+                if not wait_for_server(base_url):
+                    print('%-12s startet nicht' % label)
+                    continue
+                results = []
+                deadline = time.time() + seconds
+                client_threads = [threading.Thread(target=_load_client, args=(base_url, tournament_id, match_ids, deadline,
+                                                                       random.Random(i), results))
+                            for i in range(clients)]
+                start = time.perf_counter()
+                for thread in client_threads:
+                    thread.start()
+                for thread in client_threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+
+            latencies = sorted(r for r in results if r is not None)
+            errors = len(results) - len(latencies)
+            print('%-12s %10d %8d %10.1f %10.1f %10.1f' % (
+                label, len(latencies), errors, len(latencies) / elapsed,
+                percentile(latencies, 50) or 0, percentile(latencies, 95) or 0))
+
+SCALE_ENDPOINTS = ('create_tournament', 'update_score', 'tournament_view', 'tournament_view_cached', 'tournament_view_304')
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(samples):
+    """Aggregates a list of (ms, statements) samples of one endpoint."""
+    times = sorted(sample[0] for sample in samples)
+    statements = [sample[1] for sample in samples]
+    return {
+        'count': len(times),
+        'mean_ms': round(statistics.mean(times), 3),
+        'p50_ms': round(percentile(times, 50), 3),
+        'p90_ms': round(percentile(times, 90), 3),
+        'p99_ms': round(percentile(times, 99), 3),
+        'max_ms': round(times[-1], 3),
+        'sql_statements_mean': round(statistics.mean(statements), 1),
+        'sql_statements_max': max(statements),
+    }
+
+class StatementCounter:
+    """Counts SQL statements sent to an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+def playable_match_ids(tournament_id):
+    """Open matches that already have both players."""
+    return [match_id for (match_id,) in db.session.query(Match.id).filter(
+        Match.tournament_id == tournament_id, Match.completed == False,
+        Match.player1_id != None, Match.player2_id != None)]
+
+def bench_scale(modes, sizes, views, scores, repeat, seed):
+    """
+    Builds synthetic tournaments through the test client and measures every endpoint.
+    Returns the machine-readable result.
+    """
+    rng = random.Random(seed)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        client = app.test_client()
+        with app.app_context():
+            counter = StatementCounter(db.engine)
+
+        def timed(call):
+            counter.count = 0
+            start = time.perf_counter()
+            response = call()
+            elapsed = (time.perf_counter() - start) * 1000
+            return response, (elapsed, counter.count)
+
+        def peak_kib(call):
+            tracemalloc.start()
+            call()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return round(peak / 1024.0, 1)
+
+        for mode in modes:
+            for n_players in sizes:
+                samples = {endpoint: [] for endpoint in SCALE_ENDPOINTS}
+                memory = {}
+                form = {'tournament_name': 'Bench %s %d' % (mode, n_players), 'tournament_mode': mode,
+                        'player_names': '\n'.join('Spieler %d' % i for i in range(1, n_players + 1))}
+
+                for _ in range(repeat):
+                    response, sample = timed(lambda: client.post('/create_tournament', data=form))
+                    samples['create_tournament'].append(sample)
+                memory['create_tournament'] = peak_kib(lambda: client.post('/create_tournament', data=form))
+                tournament_id = int(response.headers['Location'].rsplit('/', 1)[1])
+                url = '/tournament/%d' % tournament_id
+
+                # Random results, in the bracket modes only for matches that already have both players
+                for i in range(scores):
+                    with app.app_context():
+                        candidates = playable_match_ids(tournament_id)
+                    if not candidates:
+                        break
+                    score1, score2 = rng.choice([(3, 0), (3, 1), (3, 2), (0, 3), (1, 3), (2, 3)])
+                    match_id = rng.choice(candidates)
+                    call = lambda: client.post('/update_score/%d' % match_id, data={'score_player1': score1, 'score_player2': score2})
+                    if i == 0:
+                        memory['update_score'] = peak_kib(call)
+                    else:
+                        samples['update_score'].append(timed(call)[1])
+
+                for _ in range(views):
+                    page_cache.clear()
+                    samples['tournament_view'].append(timed(lambda: client.get(url))[1])
+                page_cache.clear()
+                memory['tournament_view'] = peak_kib(lambda: client.get(url))
+
+                response = client.get(url)
+                etag = response.headers['ETag']
+                for _ in range(views):
+                    samples['tournament_view_cached'].append(timed(lambda: client.get(url))[1])
+                    samples['tournament_view_304'].append(timed(lambda: client.get(url, headers={'If-None-Match': etag}))[1])
+                memory['tournament_view_cached'] = peak_kib(lambda: client.get(url))
+                memory['tournament_view_304'] = peak_kib(lambda: client.get(url, headers={'If-None-Match': etag}))
+
+                with app.app_context():
+                    n_matches = Match.query.filter_by(tournament_id=tournament_id, is_bye=False).count()
+                for endpoint in SCALE_ENDPOINTS:
+                    if not samples[endpoint]:
+                        continue
+                    row = {'mode': mode, 'players': n_players, 'matches': n_matches, 'endpoint': endpoint}
+                    row.update(summarize(samples[endpoint]))
+                    row['peak_memory_kib'] = memory.get(endpoint)
+                    results.append(row)
+                    print('%-12s %5d %7d %-24s p50 %9.2f ms  p99 %9.2f ms  sql %6.1f  mem %9.1f KiB' % (
+                        mode, n_players, n_matches, endpoint, row['p50_ms'], row['p99_ms'],
+                        row['sql_statements_mean'], row['peak_memory_kib'] or 0), file=sys.stderr)
+
+    return {
+        'benchmark': 'scale',
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'parameters': {'modes': modes, 'sizes': sizes, 'views': views, 'scores': scores, 'repeat': repeat, 'seed': seed},
+        'results': results,
+    }
+
+def compare_results(old_path, new_path, threshold):
+    """Prints the p50 change per (mode, players, endpoint) between two scale runs."""
+    with open(old_path) as f:
+        old = {(r['mode'], r['players'], r['endpoint']): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {(r['mode'], r['players'], r['endpoint']): r for r in json.load(f)['results']}
+
+    regressions = 0
+    print('%-12s %5s %-24s %10s %10s %8s %9s' % ('Modus', 'Sp.', 'Endpoint', 'alt p50', 'neu p50', 'Faktor', 'SQL'))
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        factor = after['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+        flag = ''
+        if factor > threshold:
+            regressions += 1
+            flag = '  <-- langsamer'
+        print('%-12s %5d %-24s %10.2f %10.2f %7.2fx %4.0f->%-4.0f%s' % (
+            key[0], key[1], key[2], before['p50_ms'], after['p50_ms'], factor,
+            before['sql_statements_mean'], after['sql_statements_mean'], flag))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    schedule = commands.add_parser('schedule', help='Schedule generation')
+    schedule.add_argument('--mode', choices=['round_robin', 'knockout', 'double_elimination'], default='round_robin')
+    schedule.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 100, 200])
+    schedule.add_argument('--repeat', type=int, default=3, help='Runs per size, the best one is reported')
+
+    pairing = commands.add_parser('pairing', help='Swiss pairing engine')
+    pairing.add_argument('--sizes', type=int, nargs='+', default=[16, 80, 200, 512])
+    pairing.add_argument('--seed', type=int, default=42)
+
+    concurrency = commands.add_parser('concurrency', help='Parallel score entry from several processes')
+    concurrency.add_argument('--workers', type=int, default=8)
+    concurrency.add_argument('--players', type=int, default=40, help='Round robin size, 40 players = 780 matches')
+
+    serving = commands.add_parser('serving', help='HTTP throughput of the dev server vs. serve.py')
+    serving.add_argument('--clients', type=int, default=16, help='Concurrent HTTP clients')
+    serving.add_argument('--seconds', type=int, default=10, help='Duration per server')
+    serving.add_argument('--players', type=int, default=24)
+    serving.add_argument('--workers', type=int, default=2, help='serve.py worker processes')
+    serving.add_argument('--threads', type=int, default=16, help='serve.py threads per worker')
+
+    scale = commands.add_parser('scale', help='Latency, SQL statements and memory per endpoint for growing fields')
+    scale.add_argument('--modes', nargs='+', choices=['round_robin', 'knockout', 'double_elimination', 'swiss', 'groups'], default=['round_robin', 'knockout'])
+    scale.add_argument('--sizes', type=int, nargs='+', default=[8, 16, 32, 64, 128, 256, 512])
+    scale.add_argument('--views', type=int, default=20, help='Page views per tournament and variant')
+    scale.add_argument('--scores', type=int, default=50, help='Random results entered per tournament')
+    scale.add_argument('--repeat', type=int, default=3, help='Tournament creations per size')
+    scale.add_argument('--seed', type=int, default=42)
+    scale.add_argument('--json', dest='json_path', help='Write the results to this file (default: stdout)')
+
+    compare = commands.add_parser('compare', help='Compare two scale runs')
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=1.2, help='p50 factor reported as regression')
+
+    args = parser.parse_args()
+    if args.command == 'scale':
+        result = bench_scale(args.modes, args.sizes, args.views, args.scores, args.repeat, args.seed)
+        if args.json_path:
+            with open(args.json_path, 'w') as f:
+                json.dump(result, f, indent=2)
+        else:
+            json.dump(result, sys.stdout, indent=2)
+    elif args.command == 'compare':
+        sys.exit(1 if compare_results(args.old, args.new, args.threshold) else 0)
+    elif args.command == 'schedule':
+        bench_schedule(args.mode, args.sizes, args.repeat)
+    elif args.command == 'pairing':
+        bench_pairing(args.sizes, args.seed)
+    elif args.command == 'concurrency':
+        bench_concurrency(args.workers, args.players)
+    elif args.command == 'serving':
+        bench_serving(args.clients, args.seconds, args.players, args.workers, args.threads)
+
+if __name__ == '__main__':
+    main()
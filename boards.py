@@ -0,0 +1,59 @@
+def _other(match, player_id):
+    return match[2] if match[1] == player_id else match[1]
+
+def plan_boards(free_boards, waiting, busy_players=()):
+    """
+    Chooses the matches to call to the free boards.
+
+    free_boards:  board numbers without a match, in the order they should be filled
+    waiting:      (match_id, player1_id, player2_id) of the playable matches, queue order first
+    busy_players: players currently playing on another board
+
+    Matches that can run at the same time form a matching in the graph of players
+    (vertices) and waiting matches (edges). The matching is built greedily in queue order,
+    then grown with augmenting paths of length three: a chosen match a-b is replaced by
+    a-c and b-d if c and d are both still free. Without such paths the matching has at
+    least 2/3 of the maximum size, found in O(m) per added match for m waiting matches.
+    Returns [(board, match_id)], earlier matches on the lower boards.
+    """
+    free_boards = list(free_boards)
+    busy = set(busy_players)
+    candidates = [match for match in waiting if match[1] not in busy and match[2] not in busy]
+    order = {match[0]: index for index, match in enumerate(candidates)}
+
+    chosen = []
+    used = set()
+    for match in candidates:
+        if len(chosen) == len(free_boards):
+            break
+        if match[1] not in used and match[2] not in used:
+            chosen.append(match)
+            used.update(match[1:])
+
+    if len(chosen) < len(free_boards):
+        by_player = {}
+        for match in candidates:
+            for player_id in match[1:]:
+                by_player.setdefault(player_id, []).append(match)
+
+        def augment():
+            # Lowest priority match first, it is the cheapest to give up
+            for index in range(len(chosen) - 1, -1, -1):
+                match_id, a, b = chosen[index]
+                for first in by_player[a]:
+                    c = _other(first, a)
+                    if c in used:
+                        continue
+                    for second in by_player[b]:
+                        d = _other(second, b)
+                        if d not in used and d != c:
+                            chosen[index:index + 1] = [first, second]
+                            used.update((c, d))
+                            return True
+            return False
+
+        while len(chosen) < len(free_boards) and augment():
+            pass
+
+    chosen.sort(key=lambda match: order[match[0]])
+    return [(board, match[0]) for board, match in zip(free_boards, chosen)]
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+import threading
+
+class LRUCache:
+    """
+    Small thread-safe in-process LRU cache.
+    Used for rendered pages keyed by (tournament_id, revision); since the revision
+    changes with every update, stale entries are never served and simply age out.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+page_cache = LRUCache()
+# Ranked tables of single groups, keyed by (tournament_id, group_number, results of the group)
+group_cache = LRUCache(maxsize=512)
+# Rendered parts of tournament pages (match, round, standings), keyed by the data they show
+fragment_cache = LRUCache(maxsize=4096)
+
+def revision_etag(tournament_id, revision):
+    """Strong ETag value for a tournament page at a given revision."""
+    return 't%d-r%d' % (tournament_id, revision)
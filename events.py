@@ -0,0 +1,71 @@
+import json
+import queue
+import threading
+
+class Broadcaster:
+    """
+    In-process publish/subscribe hub for the Server-Sent Events feed.
+    Every client gets its own bounded queue. A client that falls behind does not
+    grow memory: its backlog is dropped and replaced by a single 'resync' event,
+    which tells the browser to reload the page once.
+    Queue items are (event_id, message) pairs, the event id being the tournament revision.
+    """
+
+    def __init__(self, queue_size=50):
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, tournament_id):
+        client = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(tournament_id, set()).add(client)
+        return client
+
+    def unsubscribe(self, tournament_id, client):
+        with self._lock:
+            clients = self._subscribers.get(tournament_id)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self._subscribers[tournament_id]
+
+    def subscriber_count(self, tournament_id):
+        with self._lock:
+            return len(self._subscribers.get(tournament_id, ()))
+
+    def publish(self, tournament_id, event_type, data, event_id=None):
+        """Formats the event once and hands it to every subscriber of the tournament."""
+        with self._lock:
+            clients = list(self._subscribers.get(tournament_id, ()))
+        if not clients:
+            return
+        message = format_sse(event_type, data, event_id)
+        for client in clients:
+            try:
+                client.put_nowait((event_id, message))
+            except queue.Full:
+                self._overflow(client, event_id)
+
+    def _overflow(self, client, event_id):
+        # Drop the backlog, the client has to reload anyway
+        try:
+            while True:
+                client.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            client.put_nowait((event_id, format_sse('resync', {}, event_id)))
+        except queue.Full:
+            pass
+
+def format_sse(event_type, data, event_id=None):
+    """Serializes a single event in the text/event-stream wire format."""
+    lines = []
+    if event_id is not None:
+        lines.append('id: %s' % event_id)
+    lines.append('event: %s' % event_type)
+    lines.append('data: %s' % json.dumps(data, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+broadcaster = Broadcaster()
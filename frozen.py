@@ -0,0 +1,113 @@
+import json
+from datetime import datetime
+from sqlalchemy import or_
+from models import db, Tournament, FrozenTournament
+from snapshot import PlayerView, MatchView, TournamentView
+from utils import STAT_FIELDS
+
+# Stored per match, the players are referenced by ID
+MATCH_FIELDS = tuple(field for field in MatchView._fields if field not in ('player1', 'player2'))
+
+def _stats_row(row):
+    return [row['player'].id] + [row[field] for field in STAT_FIELDS]
+
+def freeze_page(context):
+    """
+    Compact JSON for the template context of a tournament page (see tournament_page_context).
+    Every player and match is stored once as a plain list, the standings, group tables,
+    rounds and bracket columns only hold their IDs.
+    """
+    players = {}
+    matches = {}
+
+    def match_id(match):
+        for player in (match.player1, match.player2):
+            if player is not None:
+                players[player.id] = [player.name, player.group_number]
+        matches[match.id] = [getattr(match, field) for field in MATCH_FIELDS]
+        return match.id
+
+    def stats(rows):
+        for row in rows:
+            players[row['player'].id] = [row['player'].name, row['player'].group_number]
+        return [_stats_row(row) for row in rows]
+
+    tournament = context['tournament']
+    data = {
+        'tournament': list(tournament._replace(date_created=tournament.date_created.isoformat()
+                                                if tournament.date_created else None)),
+        'standings': stats(context['standings']),
+        'rounds': [[round_num, [match_id(m) for m in round_matches]]
+                   for round_num, round_matches in context['matches_by_round'].items()],
+        'bracket': [[section_title, [[column['key'], column['title'], [match_id(m) for m in column['matches']]]
+                                     for column in columns]]
+                    for section_title, columns in context['bracket_sections']],
+        'groups': [[group['letter'], group['completed'], group['total'], stats(group['table']),
+                    [match_id(m) for m in group['matches']]] for group in context['groups']],
+        'flags': {name: context[name] for name in ('all_matches_completed', 'total_matches', 'completed_matches',
+                                                   'swiss_round', 'next_round_ready', 'group_stage_closed')},
+    }
+    data['players'] = players
+    data['matches'] = list(matches.values())
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+def thaw_page(data):
+    """Rebuilds the template context stored by freeze_page, nothing is recomputed."""
+    data = json.loads(data)
+    tournament = TournamentView(*data['tournament'])
+    if tournament.date_created:
+        tournament = tournament._replace(date_created=datetime.fromisoformat(tournament.date_created))
+    players = {int(pid): PlayerView(int(pid), name, group_number)
+               for pid, (name, group_number) in data['players'].items()}
+    matches = {}
+    for values in data['matches']:
+        # Fields appended to MatchView after the page was frozen are None
+        row = dict(dict.fromkeys(MATCH_FIELDS), **dict(zip(MATCH_FIELDS, values)))
+        matches[row['id']] = MatchView(player1=players.get(row['player1_id']),
+                                       player2=players.get(row['player2_id']), **row)
+
+    def stats(rows):
+        return [dict(zip(STAT_FIELDS, values), player=players[pid]) for pid, *values in rows]
+
+    context = dict(data['flags'])
+    context.update(
+        tournament=tournament,
+        standings=stats(data['standings']),
+        matches_by_round={round_num: [matches[mid] for mid in ids] for round_num, ids in data['rounds']},
+        bracket_sections=[(section_title, [{'key': key, 'title': title, 'matches': [matches[mid] for mid in ids]}
+                                           for key, title, ids in columns])
+                          for section_title, columns in data['bracket']],
+        groups=[{'letter': letter, 'completed': completed, 'total': total, 'table': stats(table),
+                 'matches': [matches[mid] for mid in ids]}
+                for letter, completed, total, table, ids in data['groups']],
+    )
+    return context
+
+def load_frozen_page(tournament_id):
+    """
+    The frozen template context of a finished tournament in one query, or None if the
+    tournament was not frozen yet or changed since (revision differs).
+    """
+    data = db.session.query(FrozenTournament.data).join(
+        Tournament, Tournament.id == FrozenTournament.tournament_id).filter(
+        FrozenTournament.tournament_id == tournament_id,
+        FrozenTournament.revision == Tournament.revision).scalar()
+    return thaw_page(data) if data is not None else None
+
+def store_frozen_page(context):
+    """Stores the page context of a finished tournament in the current transaction."""
+    tournament = context['tournament']
+    row = db.session.get(FrozenTournament, tournament.id)
+    if row is None:
+        row = FrozenTournament(tournament_id=tournament.id)
+        db.session.add(row)
+    row.revision = tournament.revision
+    row.data = freeze_page(context)
+
+def stale_frozen_ids():
+    """Finished tournaments without a frozen page or with one from an older revision."""
+    query = db.session.query(Tournament.id).outerjoin(
+        FrozenTournament, FrozenTournament.tournament_id == Tournament.id).filter(
+        Tournament.is_finished == True,
+        or_(FrozenTournament.tournament_id == None, FrozenTournament.revision != Tournament.revision))
+    return [tournament_id for (tournament_id,) in query.order_by(Tournament.id)]
@@ -1,4 +1,6 @@
+from flask import has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -8,9 +10,28 @@ class Tournament(db.Model):
     name = db.Column(db.String(100), nullable=False)
     date_created = db.Column(db.DateTime, default=datetime.utcnow)
     is_finished = db.Column(db.Boolean, default=False)
-    mode = db.Column(db.String(50), nullable=False, default='round_robin') # 'round_robin', 'knockout', etc.
+    mode = db.Column(db.String(50), nullable=False, default='round_robin') # 'round_robin', 'knockout', 'double_elimination', 'swiss', 'groups'
+    swiss_rounds = db.Column(db.Integer, nullable=True) # Swiss: number of rounds to be played
+    group_count = db.Column(db.Integer, nullable=True) # Groups: number of groups
+    group_advance = db.Column(db.Integer, nullable=True) # Groups: players per group reaching the knockout stage
+    boards = db.Column(db.Integer, nullable=True) # Dartboards the scheduler assigns matches to, None = no assignment
+    revision = db.Column(db.Integer, nullable=False, default=1) # Bumped on every change, used for ETags and page caching
+    total_matches = db.Column(db.Integer, nullable=False, default=0) # Matches to be played, byes excluded
+    completed_matches = db.Column(db.Integer, nullable=False, default=0)
     matches = db.relationship('Match', backref='tournament', cascade="all, delete-orphan")
     players = db.relationship('Player', backref='tournament', cascade="all, delete-orphan")
+    standings = db.relationship('Standing', backref='tournament', cascade="all, delete-orphan")
+    frozen = db.relationship('FrozenTournament', uselist=False, cascade="all, delete-orphan")
+    uploads = db.relationship('ScoreUpload', backref='tournament', cascade="all, delete-orphan")
+
+    __table_args__ = (
+        db.Index('ix_tournament_name', 'name'),
+        db.Index('ix_tournament_date_created', 'date_created'),
+    )
+
+    @property
+    def open_matches(self):
+        return self.total_matches - self.completed_matches
 
     def __repr__(self):
         return '<Tournament %r>' % self.name
@@ -19,6 +40,14 @@ class Player(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
     tournament_id = db.Column(db.Integer, db.ForeignKey('tournament.id'), nullable=False)
+    group_number = db.Column(db.Integer, nullable=True) # Groups mode: 1..group_count
+    profile_id = db.Column(db.Integer, db.ForeignKey('player_profile.id'), nullable=True) # Same person across tournaments
+
+    __table_args__ = (
+        db.Index('ix_player_tournament_id', 'tournament_id'),
+        db.Index('ix_player_profile_id', 'profile_id'),
+        db.Index('ix_player_name', 'name'),
+    )
 
     def __repr__(self):
         return '<Player %r>' % self.name
@@ -43,6 +72,174 @@ class Match(db.Model):
     loser_next_match = db.relationship('Match', foreign_keys=[loser_next_match_id], remote_side=[id], backref='previous_matches_loser')
 
     is_third_place = db.Column(db.Boolean, default=False)
+    is_bye = db.Column(db.Boolean, nullable=False, default=False) # Player advances without playing, not counted as a match
+    bracket = db.Column(db.String(1), nullable=True) # Double elimination: 'W'inners, 'L'osers, 'G'rand final, 'R'eset
+    group_number = db.Column(db.Integer, nullable=True) # Groups mode: group stage match, None for the knockout stage
+    board = db.Column(db.Integer, nullable=True) # Board the open match is called to (see assign_boards)
+    rating_change = db.Column(db.Float, nullable=True) # Rating points player1 gained (player2 lost), None if not counted in the profiles
+    version = db.Column(db.Integer, nullable=False, default=1) # Bumped on every change of the match, for conflict detection
+    changed_revision = db.Column(db.Integer, nullable=False, default=0) # Tournament revision of the last change, for the delta sync
+
+    __table_args__ = (
+        db.Index('ix_match_tournament_round', 'tournament_id', 'round_number', 'id'),
+        db.Index('ix_match_tournament_completed', 'tournament_id', 'completed'),
+        db.Index('ix_match_tournament_changed', 'tournament_id', 'changed_revision'),
+        db.Index('ix_match_tournament_board', 'tournament_id', 'board'),
+        db.Index('ix_match_player1_id', 'player1_id'),
+        db.Index('ix_match_player2_id', 'player2_id'),
+    )
+
+    def __repr__(self):
+        # Use the foreign keys so that printing a match never triggers a lazy load
+        return '<Match %r vs %r (Round %d)>' % (self.player1_id, self.player2_id or 'BYE', self.round_number)
+
+class Standing(db.Model):
+    """Persisted per-player table row, kept up to date with deltas on every match change."""
+    id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournament.id'), nullable=False)
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
+    player = db.relationship('Player')
+    points = db.Column(db.Integer, nullable=False, default=0)
+    wins = db.Column(db.Integer, nullable=False, default=0)
+    losses = db.Column(db.Integer, nullable=False, default=0)
+    draws = db.Column(db.Integer, nullable=False, default=0)
+    legs_won = db.Column(db.Integer, nullable=False, default=0)
+    legs_lost = db.Column(db.Integer, nullable=False, default=0)
+    open_matches = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('tournament_id', 'player_id'),)
+
+    def to_stats(self, player=None):
+        """Returns the row in the dict shape used by sort_standings and the templates."""
+        return {'player': player or self.player, 'points': self.points, 'wins': self.wins,
+                'losses': self.losses, 'draws': self.draws, 'legs_won': self.legs_won,
+                'legs_lost': self.legs_lost, 'open_matches': self.open_matches}
+
+    def __repr__(self):
+        return '<Standing %r: %d Pkt>' % (self.player_id, self.points)
+
+class ScoreUpload(db.Model):
+    """
+    A score entry a tablet uploaded from its offline queue, identified by the key the
+    tablet gave it. A queue that is sent again gets the stored outcome instead of being
+    applied a second time.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournament.id'), nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    match_id = db.Column(db.Integer, nullable=True)
+    status = db.Column(db.String(10), nullable=False) # 'applied', 'conflict' or 'rejected'
+    version = db.Column(db.Integer, nullable=True) # Match version after the upload
+    error = db.Column(db.String(200), nullable=True)
+    date_created = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('tournament_id', 'key'),)
+
+    def __repr__(self):
+        return '<ScoreUpload %r: %s>' % (self.key, self.status)
+
+class FrozenTournament(db.Model):
+    """
+    The finished tournament page, computed once: final standings, group tables, match list
+    and bracket as compact JSON in one row (see frozen.py). Only valid for the revision it
+    was frozen at, anything else is rendered live again.
+    """
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournament.id'), primary_key=True)
+    revision = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.Text, nullable=False)
+
+    def __repr__(self):
+        return '<FrozenTournament %r (r%d)>' % (self.tournament_id, self.revision)
+
+class PlayerProfile(db.Model):
+    """
+    A person across all tournaments, identified by name. Rating and lifetime stats
+    are updated by delta whenever a result is entered or removed (see update_ratings).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False, unique=True)
+    search_name = db.Column(db.String(80), nullable=True) # Case-folded name for the prefix search (see suggest_players)
+    last_played = db.Column(db.DateTime, nullable=True) # Start of the latest tournament of this person
+    rating = db.Column(db.Float, nullable=False, default=1500.0) # Elo
+    tournaments = db.Column(db.Integer, nullable=False, default=0)
+    matches = db.Column(db.Integer, nullable=False, default=0)
+    wins = db.Column(db.Integer, nullable=False, default=0)
+    losses = db.Column(db.Integer, nullable=False, default=0)
+    draws = db.Column(db.Integer, nullable=False, default=0)
+    legs_won = db.Column(db.Integer, nullable=False, default=0)
+    legs_lost = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_player_profile_rating', 'rating'),
+        db.Index('ix_player_profile_search_name', 'search_name'),
+        # Suggestions without a prefix: most tournaments, then most recent, read in index order
+        db.Index('ix_player_profile_popularity', 'tournaments', 'last_played'),
+    )
+
+    @property
+    def win_rate(self):
+        return self.wins / self.matches if self.matches else 0.0
 
     def __repr__(self):
-        return '<Match %r vs %r (Round %d)>' % (self.player1.name, self.player2.name if self.player2 else 'BYE', self.round_number)
+        return '<PlayerProfile %r: %.0f>' % (self.name, self.rating)
+
+def upgrade_schema():
+    """
+    Brings an existing database up to date with the models.
+    db.create_all() only creates missing tables, so columns and indexes added to
+    existing tables later on are added here. Safe to run on every start.
+    """
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = 'ALTER TABLE %s ADD COLUMN %s %s' % (
+                    table.name, column.name, column.type.compile(dialect=db.engine.dialect))
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if default is not None:
+                    if isinstance(default, bool):
+                        default = int(default)
+                    ddl += " DEFAULT '%s'" % default if isinstance(default, str) else ' DEFAULT %s' % default
+                    if not column.nullable:
+                        ddl += ' NOT NULL'
+                conn.execute(text(ddl))
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+
+def configure_sqlite(engine, wal=True, busy_timeout_ms=15000):
+    """
+    Tunes an SQLite engine for several tablets entering scores at the same time.
+    WAL lets readers continue while one request writes, the busy timeout makes writers
+    wait for each other instead of failing, and write requests take the write lock
+    with BEGIN IMMEDIATE at the start of their transaction.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        # Disable pysqlite's own transaction handling, _on_begin emits BEGIN instead
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        if wal:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=%d' % busy_timeout_ms)
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def _on_begin(connection):
+        # A deferred transaction that reads first and writes later cannot wait for a
+        # concurrent writer in WAL mode, it fails right away with "database is locked".
+        if has_request_context() and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        else:
+            connection.exec_driver_sql('BEGIN')
@@ -0,0 +1,148 @@
+"""
+Opt-in request profiling: SQL statement count and time, named phases (standings,
+rendering) and the total per request, sent as Server-Timing header and aggregated
+into per-route histograms under /metrics (Prometheus text format, local clients only).
+
+Nothing is registered unless PROFILING is enabled for an app, and timed() then returns a
+shared no-op context manager, so the instrumentation costs next to nothing when switched off.
+The switch and the metrics live in app.extensions['profiling'], every app created with
+create_app() is profiled on its own.
+"""
+import contextlib
+import threading
+import time
+
+from flask import Response, abort, current_app, g, has_request_context, request
+
+# Upper bounds of the duration histogram buckets in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NOOP = contextlib.nullcontext()
+
+class _PhaseTimer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if has_request_context() and hasattr(g, 'profile_phases'):
+            g.profile_phases[self.name] = g.profile_phases.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+def timed(name):
+    """Context manager that records the duration of a named phase of the current request."""
+    if not has_request_context() or 'profiling' not in current_app.extensions:
+        return _NOOP
+    return _PhaseTimer(name)
+
+class RouteMetrics:
+    """Thread-safe aggregation of request durations, SQL statements and phases per route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, duration, sql_count, sql_time, phases):
+        with self._lock:
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = self._routes[route] = {'count': 0, 'sum': 0.0, 'buckets': [0] * len(BUCKETS),
+                                               'sql_count': 0, 'sql_time': 0.0, 'phases': {}}
+            entry['count'] += 1
+            entry['sum'] += duration
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    entry['buckets'][i] += 1
+                    break
+            entry['sql_count'] += sql_count
+            entry['sql_time'] += sql_time
+            for name, value in phases.items():
+                entry['phases'][name] = entry['phases'].get(name, 0.0) + value
+
+    def render(self):
+        """Prometheus text exposition of all routes."""
+        with self._lock:
+            routes = {route: dict(entry, buckets=list(entry['buckets']), phases=dict(entry['phases']))
+                      for route, entry in self._routes.items()}
+
+        lines = ['# TYPE adarts_request_duration_seconds histogram']
+        for route, entry in sorted(routes.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, entry['buckets']):
+                cumulative += count
+                lines.append('adarts_request_duration_seconds_bucket{route="%s",le="%s"} %d' % (route, bound, cumulative))
+            lines.append('adarts_request_duration_seconds_bucket{route="%s",le="+Inf"} %d' % (route, entry['count']))
+            lines.append('adarts_request_duration_seconds_sum{route="%s"} %.6f' % (route, entry['sum']))
+            lines.append('adarts_request_duration_seconds_count{route="%s"} %d' % (route, entry['count']))
+
+        lines.append('# TYPE adarts_sql_statements_total counter')
+        for route, entry in sorted(routes.items()):
+            lines.append('adarts_sql_statements_total{route="%s"} %d' % (route, entry['sql_count']))
+        lines.append('# TYPE adarts_sql_duration_seconds_total counter')
+        for route, entry in sorted(routes.items()):
+            lines.append('adarts_sql_duration_seconds_total{route="%s"} %.6f' % (route, entry['sql_time']))
+        lines.append('# TYPE adarts_phase_duration_seconds_total counter')
+        for route, entry in sorted(routes.items()):
+            for name, value in sorted(entry['phases'].items()):
+                lines.append('adarts_phase_duration_seconds_total{route="%s",phase="%s"} %.6f' % (route, name, value))
+        return '\n'.join(lines) + '\n'
+
+def init_profiling(app, engine):
+    """Registers the instrumentation if app.config['PROFILING'] is set."""
+    if not app.config.get('PROFILING'):
+        return
+    metrics = app.extensions['profiling'] = RouteMetrics()
+
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profile_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['profile_start'].pop()
+        if has_request_context() and hasattr(g, 'profile_sql_count'):
+            g.profile_sql_count += 1
+            g.profile_sql_time += elapsed
+
+    @event.listens_for(engine, 'handle_error')
+    def _on_error(context):
+        # A failed statement never reaches after_cursor_execute
+        stack = context.connection.info.get('profile_start') if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+    @app.before_request
+    def _start_profile():
+        g.profile_start = time.perf_counter()
+        g.profile_sql_count = 0
+        g.profile_sql_time = 0.0
+        g.profile_phases = {}
+
+    @app.after_request
+    def _finish_profile(response):
+        if not hasattr(g, 'profile_start'):
+            return response
+        duration = time.perf_counter() - g.profile_start
+        timings = ['sql;desc="%d queries";dur=%.2f' % (g.profile_sql_count, g.profile_sql_time * 1000)]
+        timings += ['%s;dur=%.2f' % (name, value * 1000) for name, value in g.profile_phases.items()]
+        timings.append('total;dur=%.2f' % (duration * 1000))
+        response.headers['Server-Timing'] = ', '.join(timings)
+
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.record(route, duration, g.profile_sql_count, g.profile_sql_time, g.profile_phases)
+        return response
+
+    def metrics_view():
+        # Local diagnosis only
+        if request.remote_addr not in ('127.0.0.1', '::1'):
+            abort(403)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -1,21 +1,63 @@
-from flask import Blueprint, render_template, request, redirect, url_for
-from models import db, Tournament, Player, Match
-from utils import sort_standings, generate_round_robin_schedule, generate_knockout_schedule, advance_winner
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, abort, make_response, Response, jsonify, stream_with_context
+from models import db, Tournament, Player, Match, PlayerProfile, ScoreUpload
+from utils import is_bracket_match, rank_standings, generate_round_robin_schedule, generate_knockout_schedule, generate_double_elimination_schedule, generate_swiss_round, generate_group_stage, default_group_count, start_group_knockout, group_tables, rank_groups, current_round, apply_score, reopen_with_cascade, rebuild_standings, rebuild_counters, register_profiles, suggest_players, assign_boards, board_queue, bump_revision, current_revision
+from snapshot import load_tournament_snapshot, load_match_views, match_to_dict, standings_to_list
+from archive import ARCHIVE_MODELS, export_ndjson, export_csv
+from frozen import load_frozen_page, store_frozen_page, stale_frozen_ids
+from swiss import default_swiss_rounds
+from cache import page_cache, fragment_cache, revision_etag
+from events import broadcaster, format_sse
+from profiling import timed
+from sqlalchemy import func, or_, and_, insert, update
 from datetime import datetime
+import queue
 
 main = Blueprint('main', __name__)
 
+def publish_tournament_event(tournament_id, event_type, match_ids=()):
+    """
+    Pushes the changed matches and the new standings to all live displays of a tournament.
+    Must be called after the commit. Does nothing if nobody is listening.
+    """
+    if not broadcaster.subscriber_count(tournament_id):
+        return
+    snapshot = load_tournament_snapshot(tournament_id)
+    if snapshot is None:
+        return
+    tournament = snapshot.tournament
+    standings = rank_standings(tournament.mode, snapshot.player_stats, snapshot.matches)
+    data = {
+        'tournament_id': tournament.id,
+        'revision': tournament.revision,
+        'is_finished': tournament.is_finished,
+        'completed_matches': tournament.completed_matches,
+        'total_matches': tournament.total_matches,
+        'matches': [match_to_dict(m) for m in snapshot.matches if m.id in match_ids],
+        'standings': standings_to_list(standings),
+    }
+    broadcaster.publish(tournament_id, event_type, data, event_id=tournament.revision)
+
 @main.route('/')
 def index():
-    tournaments = Tournament.query.order_by(Tournament.date_created.desc()).all()
-    
-    # Get all unique player names, excluding the dummy player
-    known_player_names_query = db.session.query(Player.name).filter(Player.name != "BYE_PLAYER_DUMMY").distinct().all()
-    known_player_names = [name[0] for name in known_player_names_query]
+    # Keyset pagination, newest first: ?before=<id> continues below that tournament, so every
+    # page costs the same no matter how many tournaments are older
+    page_size = current_app.config['TOURNAMENTS_PER_PAGE']
+    before = request.args.get('before', type=int)
+    query = db.session.query(Tournament.id, Tournament.name, Tournament.mode, Tournament.is_finished, Tournament.date_created)
+    cursor = db.session.query(Tournament.date_created).filter_by(id=before).scalar() if before is not None else None
+    if cursor is not None:
+        query = query.filter(or_(Tournament.date_created < cursor,
+                                 and_(Tournament.date_created == cursor, Tournament.id < before)))
+    rows = query.order_by(Tournament.date_created.desc(), Tournament.id.desc()).limit(page_size + 1).all()
+    tournaments = rows[:page_size]
+    older_before = tournaments[-1].id if len(rows) > page_size else None
+
+    # Only the most frequent players, all others are found with the search (api_player_suggestions)
+    suggested_players = suggest_players('', current_app.config['PLAYER_SUGGESTIONS'])
 
     default_tournament_name = f"Turnier vom {datetime.now().strftime('%d.%m.%Y')}"
 
-    return render_template('index.html', tournaments=tournaments, known_player_names=known_player_names, default_tournament_name=default_tournament_name)
+    return render_template('index.html', tournaments=tournaments, older_before=older_before, is_first_page=cursor is None, suggested_players=suggested_players, default_tournament_name=default_tournament_name)
 
 @main.route('/create_tournament', methods=['POST'])
 def create_tournament():
@@ -30,248 +72,799 @@ def create_tournament():
     if len(player_names) < 2:
         return redirect(url_for('main.index')) # Not enough players
 
-    # Handle duplicate tournament names
+    # Handle duplicate tournament names, one indexed query for all candidates
     original_name = tournament_name
+    taken_names = {name for (name,) in db.session.query(Tournament.name).filter(
+        Tournament.name.startswith(original_name, autoescape=True))}
     counter = 1
-    while Tournament.query.filter_by(name=tournament_name).first() is not None:
+    while tournament_name in taken_names:
         counter += 1
         tournament_name = f"{original_name} ({counter})"
 
     # Create new Tournament
     tournament = Tournament(name=tournament_name, mode=tournament_mode)
+    if tournament_mode == 'swiss':
+        swiss_rounds = request.form.get('swiss_rounds', type=int) or default_swiss_rounds(len(player_names))
+        tournament.swiss_rounds = max(1, min(swiss_rounds, len(player_names) - 1))
+    elif tournament_mode == 'groups':
+        group_count = request.form.get('group_count', type=int) or default_group_count(len(player_names))
+        tournament.group_count = max(1, min(group_count, len(player_names) // 2))
+        group_advance = request.form.get('group_advance', type=int) or 2
+        # At least two players have to reach the knockout stage
+        smallest_group = len(player_names) // tournament.group_count
+        tournament.group_advance = max(1 if tournament.group_count > 1 else 2, min(group_advance, smallest_group))
+    boards = request.form.get('boards', type=int)
+    tournament.boards = boards if boards and boards > 0 else None
     db.session.add(tournament)
-    db.session.commit() # Commit to get ID
+    db.session.flush() # Flush to get ID
 
-    players = []
-    for name in player_names:
-        player = Player(name=name, tournament_id=tournament.id)
-        db.session.add(player)
-        players.append(player)
-    db.session.commit()
+    # One bulk insert that returns the players with their IDs for the schedule; everything
+    # is committed once at the end. RETURNING does not promise the order of the rows, the
+    # IDs follow the order of the names.
+    profile_ids = register_profiles(player_names)
+    players = sorted(db.session.scalars(
+        insert(Player).returning(Player),
+        [dict(name=name, tournament_id=tournament.id, profile_id=profile_ids[name]) for name in player_names]),
+        key=lambda player: player.id)
 
     if tournament_mode == 'round_robin':
         generate_round_robin_schedule(tournament.id, players)
     elif tournament_mode == 'knockout':
         generate_knockout_schedule(tournament.id, players)
-    
+    elif tournament_mode == 'double_elimination':
+        generate_double_elimination_schedule(tournament.id, players, bracket_reset=bool(request.form.get('bracket_reset')))
+    elif tournament_mode == 'swiss':
+        generate_swiss_round(tournament.id, players)
+    elif tournament_mode == 'groups':
+        generate_group_stage(tournament.id, players, tournament.group_count)
+
+    rebuild_standings(tournament.id)
+    rebuild_counters(tournament.id)
+    assign_boards(tournament.id)
+    bump_revision(tournament.id)
+    db.session.commit()
+
     return redirect(url_for('main.tournament_view', tournament_id=tournament.id))
 
+def knockout_stage_exists(tournament_id):
+    """Groups mode: True once the knockout stage has been drawn."""
+    return db.session.query(Match.id).filter_by(tournament_id=tournament_id, group_number=None).first() is not None
+
+def results_locked(match):
+    """Results of a finished tournament and of a closed group stage cannot change any more."""
+    return bool(match.tournament.is_finished) or group_stage_closed(match)
+
+def group_stage_closed(match):
+    """Group results cannot change any more once the knockout stage was drawn from them."""
+    if match.group_number is None or match.tournament.mode != 'groups':
+        return False
+    return knockout_stage_exists(match.tournament_id)
+
 @main.route('/update_score/<int:match_id>', methods=['POST'])
 def update_score(match_id):
     match = Match.query.get_or_404(match_id)
     score_player1 = request.form.get('score_player1', type=int)
     score_player2 = request.form.get('score_player2', type=int)
 
-    if score_player1 is not None and score_player2 is not None:
-        match.score_player1 = score_player1
-        match.score_player2 = score_player2
-        match.completed = True
-        
-        # Advance winner if in knockout mode (or check next_match_id)
-        if match.tournament.mode == 'knockout':
-            advance_winner(match)
-            
+    changed_ids = set()
+    if score_player1 is not None and score_player2 is not None and not results_locked(match):
+        changed_ids = set(apply_score(match, score_player1, score_player2, match.tournament.mode))
+        if match.tournament.mode == 'groups':
+            changed_ids.update(start_group_knockout(match.tournament_id))
+        board_ids = assign_boards(match.tournament_id)
+        bump_revision(match.tournament_id, changed_ids, board_ids)
+        changed_ids.update(board_ids)
         db.session.commit()
+        publish_tournament_event(match.tournament_id, 'match_updated', changed_ids)
+
+    if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+        # Sent by the tournament page, which then fetches the changed fragments itself
+        tournament = Tournament.query.get(match.tournament_id)
+        return jsonify(revision=tournament.revision, match_ids=sorted(changed_ids),
+                       completed_matches=tournament.completed_matches, total_matches=tournament.total_matches)
     return redirect(url_for('main.tournament_view', tournament_id=match.tournament_id, _anchor=f"match-{match.id}"))
 
+def score_entry_error(match, mode, score1, score2):
+    """Why a result cannot be entered for a match through the APIs, None if it can."""
+    if not match.player1_id or not match.player2_id:
+        return 'Match %d hat noch keine zwei Spieler.' % match.id
+    if group_stage_closed(match):
+        return 'Match %d gehört zur abgeschlossenen Gruppenphase.' % match.id
+    if is_bracket_match(match, mode):
+        if score1 == score2:
+            return 'Unentschieden sind im K.O.-System nicht möglich (Match %d).' % match.id
+        if match.completed:
+            return 'Match %d ist bereits beendet und muss zuerst wieder geöffnet werden.' % match.id
+    return None
+
+def parse_score_entries(results):
+    """
+    Validates the payload of the batch score API.
+    Accepts a list of {"match_id", "score1", "score2"} objects or [match_id, score1, score2] triples.
+    Returns a list of (match_id, score1, score2) tuples or raises ValueError.
+    """
+    if not isinstance(results, list) or not results:
+        raise ValueError('Keine Ergebnisse übergeben.')
+
+    entries = []
+    for entry in results:
+        if isinstance(entry, dict):
+            entry = (entry.get('match_id'), entry.get('score1'), entry.get('score2'))
+        if not isinstance(entry, (list, tuple)) or len(entry) != 3:
+            raise ValueError('Ungültiger Eintrag: %r' % (entry,))
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in entry):
+            raise ValueError('Match-ID und Ergebnisse müssen ganze Zahlen sein: %r' % (entry,))
+        if entry[1] < 0 or entry[2] < 0:
+            raise ValueError('Negative Ergebnisse sind nicht erlaubt (Match %d).' % entry[0])
+        entries.append(tuple(entry))
+
+    match_ids = [entry[0] for entry in entries]
+    if len(set(match_ids)) != len(match_ids):
+        raise ValueError('Jedes Match darf nur einmal vorkommen.')
+    return entries
+
+@main.route('/api/tournament/<int:tournament_id>/scores', methods=['POST'])
+def batch_update_scores(tournament_id):
+    """
+    Enters many results at once in a single transaction.
+    In the bracket modes the results are applied in round order, so a winner advanced by an
+    earlier entry can already be scored in the next round within the same batch.
+    Either all results are stored or none.
+    """
+    tournament = Tournament.query.get_or_404(tournament_id)
+    if tournament.is_finished:
+        return jsonify(error='Das Turnier ist bereits beendet.'), 409
+
+    payload = request.get_json(silent=True)
+    results = payload.get('results') if isinstance(payload, dict) else payload
+    try:
+        entries = parse_score_entries(results)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    # Load all matches once, advance_winner then walks the bracket without further queries
+    matches = {m.id: m for m in Match.query.filter_by(tournament_id=tournament_id).all()}
+    unknown = [entry[0] for entry in entries if entry[0] not in matches]
+    if unknown:
+        return jsonify(error='Unbekannte Matches: %s' % ', '.join(map(str, unknown))), 404
+
+    entries.sort(key=lambda entry: (matches[entry[0]].round_number, entry[0]))
+    changed_ids = set()
+    try:
+        for match_id, score1, score2 in entries:
+            match = matches[match_id]
+            error = score_entry_error(match, tournament.mode, score1, score2)
+            if error:
+                raise ValueError(error)
+            changed_ids.update(apply_score(match, score1, score2, tournament.mode, matches))
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify(error=str(e)), 400
+    if tournament.mode == 'groups':
+        changed_ids.update(start_group_knockout(tournament_id))
+    board_ids = assign_boards(tournament_id)
+
+    bump_revision(tournament_id, changed_ids, board_ids)
+    changed_ids.update(board_ids)
+    db.session.commit()
+    publish_tournament_event(tournament_id, 'match_updated', changed_ids)
+
+    snapshot = load_tournament_snapshot(tournament_id)
+    standings = rank_standings(snapshot.tournament.mode, snapshot.player_stats, snapshot.matches)
+    return jsonify(
+        revision=snapshot.tournament.revision,
+        matches=[match_to_dict(m) for m in snapshot.matches if m.id in changed_ids],
+        standings=standings_to_list(standings),
+    )
+
+def match_changes(tournament_id, since):
+    """
+    Delta sync payload: the tournament state and every match changed after revision `since`
+    (see bump_revision), read with the (tournament_id, changed_revision) index. A since of 0,
+    or one the server never handed out, returns all matches and sets 'full'.
+    """
+    revision = current_revision(tournament_id)
+    if revision is None:
+        return None
+    full = since <= 0 or since > revision
+    tournament, matches = load_match_views(tournament_id, *(() if full else (Match.changed_revision > since,)))
+    return {
+        'revision': tournament.revision,
+        'since': since,
+        'full': full,
+        'is_finished': tournament.is_finished,
+        'completed_matches': tournament.completed_matches,
+        'total_matches': tournament.total_matches,
+        'matches': [match_to_dict(m) for m in matches],
+    }
+
+@main.route('/api/tournament/<int:tournament_id>/changes')
+def api_match_changes(tournament_id):
+    """The matches changed since ?since=<revision>, for tablets catching up after a lost connection."""
+    changes = match_changes(tournament_id, request.args.get('since', 0, type=int))
+    if changes is None:
+        abort(404)
+    return jsonify(changes)
+
+def parse_sync_entries(entries):
+    """
+    Validates the offline queue of the sync API: a list of {"key", "match_id", "score1",
+    "score2", "version"} objects, key being unique per entry and version the match version
+    the tablet showed when the result was entered. Returns the list or raises ValueError.
+    """
+    if not isinstance(entries, list):
+        raise ValueError('Keine Einträge übergeben.')
+    keys = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError('Ungültiger Eintrag: %r' % (entry,))
+        key = entry.get('key')
+        if not isinstance(key, str) or not 0 < len(key) <= 64:
+            raise ValueError('Jeder Eintrag braucht einen Schlüssel mit 1 bis 64 Zeichen: %r' % (entry,))
+        if key in keys:
+            raise ValueError('Schlüssel %r kommt mehrfach vor.' % key)
+        keys.add(key)
+        values = [entry.get(name) for name in ('match_id', 'score1', 'score2', 'version')]
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+            raise ValueError('Match-ID, Ergebnisse und Version müssen ganze Zahlen sein: %r' % (entry,))
+        if values[1] < 0 or values[2] < 0:
+            raise ValueError('Negative Ergebnisse sind nicht erlaubt (Match %d).' % values[0])
+    return entries
+
+@main.route('/api/tournament/<int:tournament_id>/sync', methods=['POST'])
+def sync_scores(tournament_id):
+    """
+    Uploads the offline queue of a scoring tablet and returns what changed since the
+    tablet's last sync, in one request.
+    Entries are applied in queue order. An entry whose version no longer matches the match
+    was based on a state somebody else changed in the meantime: it is reported as a conflict
+    and not applied. Every outcome is stored under the entry's key, so resending a queue
+    after a lost response applies nothing twice and reports the same outcomes.
+    """
+    tournament = Tournament.query.get_or_404(tournament_id)
+    if tournament.is_finished:
+        return jsonify(error='Das Turnier ist bereits beendet.'), 409
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify(error='Ungültige Anfrage.'), 400
+    since = payload.get('since', 0)
+    try:
+        if not isinstance(since, int) or isinstance(since, bool):
+            raise ValueError('since muss eine ganze Zahl sein.')
+        entries = parse_sync_entries(payload.get('entries', []))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    known = {}
+    if entries:
+        known = {upload.key: upload for upload in ScoreUpload.query.filter(
+            ScoreUpload.tournament_id == tournament_id, ScoreUpload.key.in_([entry['key'] for entry in entries]))}
+    new_entries = [entry for entry in entries if entry['key'] not in known]
+
+    results = {}
+    receipts = []
+    changed_ids = set()
+    if new_entries:
+        # Load all matches once, as in the batch API
+        matches = {m.id: m for m in Match.query.filter_by(tournament_id=tournament_id).all()}
+        # Version of every match as it stands after the entries applied so far: each applied
+        # entry counts as one change of its match and of the matches it advanced players into,
+        # so a later entry based on an older version is a conflict, also within one queue
+        start_versions = {match_id: match.version for match_id, match in matches.items()}
+        versions = dict(start_versions)
+        for entry in new_entries:
+            match = matches.get(entry['match_id'])
+            error = None
+            if match is None:
+                status, error = 'rejected', 'Unbekanntes Match %d.' % entry['match_id']
+            elif entry['version'] != versions[match.id]:
+                status, error = 'conflict', 'Match %d wurde inzwischen geändert.' % match.id
+            else:
+                error = score_entry_error(match, tournament.mode, entry['score1'], entry['score2'])
+                status = 'rejected' if error else 'applied'
+            if status == 'applied':
+                applied_ids = set(apply_score(match, entry['score1'], entry['score2'], tournament.mode, matches))
+                applied_ids.add(match.id)
+                for match_id in applied_ids:
+                    versions[match_id] += 1
+                changed_ids.update(applied_ids)
+            receipts.append(dict(tournament_id=tournament_id, key=entry['key'], match_id=entry['match_id'],
+                                 status=status, version=versions.get(entry['match_id']), error=error))
+
+        if changed_ids:
+            if tournament.mode == 'groups':
+                changed_ids.update(start_group_knockout(tournament_id))
+            board_ids = assign_boards(tournament_id)
+            bump_revision(tournament_id, changed_ids, board_ids)
+            changed_ids.update(board_ids)
+            # bump_revision adds one, matches changed by several entries went up by more
+            rows = [{'id': match_id, 'version': version} for match_id, version in versions.items()
+                    if version > start_versions[match_id] + 1]
+            if rows:
+                db.session.execute(update(Match), rows)
+        db.session.execute(insert(ScoreUpload), receipts)
+        db.session.commit()
+        if changed_ids:
+            publish_tournament_event(tournament_id, 'match_updated', changed_ids)
+        results = {receipt['key']: receipt for receipt in receipts}
+
+    outcomes = []
+    for entry in entries:
+        if entry['key'] in known:
+            upload = known[entry['key']]
+            outcomes.append({'key': upload.key, 'match_id': upload.match_id, 'status': upload.status,
+                             'version': upload.version, 'error': upload.error, 'duplicate': True})
+        else:
+            receipt = results[entry['key']]
+            outcomes.append({'key': receipt['key'], 'match_id': receipt['match_id'], 'status': receipt['status'],
+                             'version': receipt['version'], 'error': receipt['error'], 'duplicate': False})
+    return jsonify(results=outcomes, **match_changes(tournament_id, since))
+
+def reopen_and_publish(match):
+    """Reopens a match (cascading through the bracket), commits and notifies live displays."""
+    changed_ids = reopen_with_cascade(match, match.tournament.mode)
+    board_ids = assign_boards(match.tournament_id)
+    bump_revision(match.tournament_id, changed_ids, board_ids)
+    db.session.commit()
+    publish_tournament_event(match.tournament_id, 'match_reopened', set(changed_ids) | set(board_ids))
+    return changed_ids
+
+def swiss_rounds_remaining(tournament):
+    """Rounds of a Swiss tournament that still have to be paired, 0 for the other modes."""
+    if tournament.mode != 'swiss':
+        return 0
+    return max(0, (tournament.swiss_rounds or 0) - current_round(tournament.id))
+
+@main.route('/tournament/<int:tournament_id>/next_round', methods=['POST'])
+def next_swiss_round(tournament_id):
+    """Pairs the next Swiss round once every match of the current one has a result."""
+    tournament = Tournament.query.get_or_404(tournament_id)
+    if (tournament.mode == 'swiss' and not tournament.is_finished and tournament.open_matches == 0
+            and swiss_rounds_remaining(tournament) > 0):
+        round_number = generate_swiss_round(tournament.id)
+        new_ids = {match_id for (match_id,) in db.session.query(Match.id).filter_by(
+            tournament_id=tournament.id, round_number=round_number)}
+        board_ids = assign_boards(tournament.id)
+        bump_revision(tournament.id, new_ids, board_ids)
+        new_ids.update(board_ids)
+        db.session.commit()
+        publish_tournament_event(tournament.id, 'round_created', new_ids)
+    return redirect(url_for('main.tournament_view', tournament_id=tournament_id))
 
 @main.route('/reopen_match/<int:match_id>', methods=['POST'])
 def reopen_match(match_id):
     match = Match.query.get_or_404(match_id)
-    match.completed = False
-    # TODO: Handle undoing advancement? 
-    # For now, just reopen. The next match might need to be reset manually or logic added.
-    # Logic to reset next match:
-    if match.tournament.mode == 'knockout' and match.next_match_id:
-        next_match = Match.query.get(match.next_match_id)
-        if next_match:
-            # Reset the slot in next match
-            if match.next_match_slot == 1:
-                next_match.player1 = None
-            elif match.next_match_slot == 2:
-                next_match.player2 = None
-            # Also reset next match scores/completion if it was started?
-            if next_match.completed:
-                # Recursive reopen? simpler to just uncomplete it.
-                next_match.completed = False
-                next_match.score_player1 = 0
-                next_match.score_player2 = 0
-                # And recursive up the chain...
-                # For MVP, just resetting immediate next match player is enough.
-            
-    db.session.commit()
+    if not results_locked(match):
+        reopen_and_publish(match)
     return redirect(url_for('main.tournament_view', tournament_id=match.tournament_id))
 
+@main.route('/api/match/<int:match_id>/reopen', methods=['POST'])
+def api_reopen_match(match_id):
+    """Like reopen_match, but reports which downstream matches were invalidated."""
+    match = Match.query.get_or_404(match_id)
+    if match.tournament.is_finished:
+        return jsonify(error='Das Turnier ist bereits beendet.'), 409
+    if group_stage_closed(match):
+        return jsonify(error='Die Gruppenphase ist bereits abgeschlossen.'), 409
+    changed_ids = reopen_and_publish(match)
+
+    snapshot = load_tournament_snapshot(match.tournament_id)
+    matches = {m.id: m for m in snapshot.matches}
+    return jsonify(
+        revision=snapshot.tournament.revision,
+        reopened=match_to_dict(matches[changed_ids[0]]),
+        invalidated=[match_to_dict(matches[mid]) for mid in changed_ids[1:]],
+    )
+
 
 @main.route('/tournament/<int:tournament_id>')
 def tournament_view(tournament_id):
-    tournament = Tournament.query.get_or_404(tournament_id)
-    matches = Match.query.filter_by(tournament_id=tournament.id).order_by(
-        Match.round_number, Match.id).all()
-    players = Player.query.filter_by(tournament_id=tournament.id).filter(
-        Player.name != "BYE_PLAYER_DUMMY").all()
+    # Only the revision is read up front, so unchanged pages never touch the match table
+    revision = current_revision(tournament_id)
+    if revision is None:
+        abort(404)
 
-    # Calculate standings (Round Robin logic mostly, but safe for KO)
-    player_stats = {player.id: {'player': player, 'points': 0, 'wins': 0,
-                                'losses': 0, 'draws': 0, 'legs_won': 0, 'legs_lost': 0, 'open_matches': 0} for player in players}
+    etag = revision_etag(tournament_id, revision)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
 
-    # Helper map to find match between two players quickly
-    match_map = {}
-    
+    html = page_cache.get((tournament_id, revision))
+    if html is None:
+        html, revision = render_tournament_page(tournament_id)
+        page_cache.set((tournament_id, revision), html)
+        etag = revision_etag(tournament_id, revision)
+
+    response = make_response(html)
+    response.set_etag(etag)
+    return response
+
+@main.route('/tournament/<int:tournament_id>/events')
+def tournament_events(tournament_id):
+    """Server-Sent Events stream with live updates for one tournament."""
+    revision = current_revision(tournament_id)
+    if revision is None:
+        abort(404)
+    client = broadcaster.subscribe(tournament_id)
+    app = current_app._get_current_object()
+    poll_seconds = app.config['SSE_POLL_SECONDS']
+    heartbeat_seconds = app.config['SSE_HEARTBEAT_SECONDS']
+
+    def stream():
+        last_revision = revision
+        idle = 0
+        try:
+            # Lets the page detect changes that happened between rendering and subscribing
+            yield format_sse('hello', {'revision': revision}, revision)
+            while True:
+                try:
+                    event_id, message = client.get(timeout=poll_seconds)
+                    if event_id is not None:
+                        last_revision = max(last_revision, event_id)
+                    idle = 0
+                    yield message
+                    continue
+                except queue.Empty:
+                    pass
+                # Changes made by other worker processes or CLI commands never reach this
+                # process' broadcaster, the revision tells us about them.
+                # Short-lived app context, so no read transaction stays open while idle.
+                with app.app_context():
+                    latest = current_revision(tournament_id)
+                if latest is not None and latest > last_revision:
+                    last_revision = latest
+                    idle = 0
+                    yield format_sse('resync', {'revision': latest}, latest)
+                    continue
+                idle += poll_seconds
+                if idle >= heartbeat_seconds:
+                    # Comment line, keeps proxies from closing the connection and detects gone clients
+                    idle = 0
+                    yield ': keepalive\n\n'
+        finally:
+            broadcaster.unsubscribe(tournament_id, client)
+
+    return Response(stream(), mimetype='text/event-stream', headers={'X-Accel-Buffering': 'no'})
+
+DOUBLE_ELIMINATION_SECTIONS = (('Gewinnerrunde', ('W',)), ('Verliererrunde', ('L',)), ('Finale', ('G', 'R')))
+
+def bracket_columns(mode, matches):
+    """
+    The bracket view as [(section title, [column])], byes left out. A column is a dict
+    with the matches of one round, its title and a key naming it in the round fragment.
+    Knockout (and the knockout stage of groups) has one untitled section, double
+    elimination one per bracket.
+    """
+    if mode == 'double_elimination':
+        sections = []
+        for section_title, codes in DOUBLE_ELIMINATION_SECTIONS:
+            rounds = {}
+            for match in matches:
+                if match.bracket in codes and not match.is_bye:
+                    rounds.setdefault(match.round_number, []).append(match)
+            columns = []
+            for position, round_num in enumerate(sorted(rounds), start=1):
+                code = rounds[round_num][0].bracket
+                if code == 'G' or (code != 'R' and position == len(rounds)):
+                    title = 'Finale'
+                elif code == 'R':
+                    title = 'Entscheidungsspiel'
+                else:
+                    title = 'Runde %d' % position
+                columns.append({'key': '%s%d' % (code, round_num), 'title': title, 'matches': rounds[round_num]})
+            if columns:
+                sections.append((section_title, columns))
+        return sections
+
+    rounds = {}
     for match in matches:
-        if match.player1_id and match.player2_id:
-            # Store match reference for direct comparison
-            p1 = match.player1_id
-            p2 = match.player2_id
-            match_map[(min(p1, p2), max(p1, p2))] = match
-            
-            if not match.completed:
-                player_stats[match.player1.id]['open_matches'] += 1
-                player_stats[match.player2.id]['open_matches'] += 1
-
-        if match.completed and match.player1_id and match.player2_id:  # Exclude byes and future matches
-            # Update legs
-            player_stats[match.player1.id]['legs_won'] += match.score_player1
-            player_stats[match.player1.id]['legs_lost'] += match.score_player2
-            player_stats[match.player2.id]['legs_won'] += match.score_player2
-            player_stats[match.player2.id]['legs_lost'] += match.score_player1
-
-            if match.score_player1 > match.score_player2:
-                # 2 points for a win
-                player_stats[match.player1.id]['points'] += 2
-                player_stats[match.player1.id]['wins'] += 1
-                player_stats[match.player2.id]['losses'] += 1
-            elif match.score_player2 > match.score_player1:
-                player_stats[match.player2.id]['points'] += 2
-                player_stats[match.player2.id]['wins'] += 1
-                player_stats[match.player1.id]['losses'] += 1
-            else:
-                # 1 point for a draw
-                player_stats[match.player1.id]['points'] += 1
-                player_stats[match.player2.id]['points'] += 1
-                player_stats[match.player1.id]['draws'] += 1
-                player_stats[match.player2.id]['draws'] += 1
-        elif match.completed and (match.player2_id is None or match.player1_id is None):  # Handle byes
-            pass
+        if match.group_number is None:
+            rounds.setdefault(match.round_number, []).append(match)
+    columns = []
+    for position, round_num in enumerate(sorted(rounds), start=1):
+        remaining = len(rounds) - position
+        title = {0: 'Finale', 1: 'Halbfinale', 2: 'Viertelfinale'}.get(remaining, 'Runde %d' % round_num)
+        columns.append({'key': 'K%d' % round_num, 'title': title,
+                        'matches': [match for match in rounds[round_num] if not match.is_bye]})
+    return [(None, columns)] if columns else []
+
+def tournament_page_context(tournament_id):
+    """Everything the tournament page template needs, computed from the live data. None if the tournament does not exist."""
+    # One fixed set of queries for the whole page, no lazy loads while rendering
+    snapshot = load_tournament_snapshot(tournament_id)
+    if snapshot is None:
+        return None
+    if (not snapshot.player_stats or not snapshot.tournament.total_matches) and snapshot.matches:
+        # Tournament created before the standings table and match counters existed
+        rebuild_standings(tournament_id)
+        rebuild_counters(tournament_id)
+        db.session.commit()
+        snapshot = load_tournament_snapshot(tournament_id)
+
+    tournament = snapshot.tournament
+    matches = snapshot.matches
+    # Standings are maintained incrementally on every score change, we only read them here.
+    player_stats = snapshot.player_stats
 
     # Sort standings using utils logic
-    if tournament.mode == 'round_robin':
-        standings = sort_standings(player_stats, matches)
-    else:
-        # KO: Rank by specific achievements
-        # 1. Winner of Final
-        # 2. Loser of Final
-        # 3. Winner of 3rd Place Match
-        # 4. Loser of 3rd Place Match
-        # 5+. Sort by wins
-        
-        # Identify specific matches
-        final_match = None
-        third_place_match = None
-        
-        # Max round number logic is brittle if we just take max(round_number) because 3rd place is also max.
-        # But we added is_third_place flag.
-        
-        # Find max round number
-        max_round = 0
-        if matches:
-            max_round = max(m.round_number for m in matches)
-            
-        for m in matches:
-            if m.round_number == max_round:
-                if m.is_third_place:
-                    third_place_match = m
-                else:
-                    final_match = m
-        
-        # Assign ranks
-        ranked_ids = []
-        
-        if final_match and final_match.completed:
-            if final_match.score_player1 > final_match.score_player2:
-                ranked_ids.append(final_match.player1_id) # 1st
-                ranked_ids.append(final_match.player2_id) # 2nd
-            else:
-                ranked_ids.append(final_match.player2_id) # 1st
-                ranked_ids.append(final_match.player1_id) # 2nd
-                
-        if third_place_match and third_place_match.completed:
-            if third_place_match.score_player1 > third_place_match.score_player2:
-                ranked_ids.append(third_place_match.player1_id) # 3rd
-                ranked_ids.append(third_place_match.player2_id) # 4th
-            else:
-                ranked_ids.append(third_place_match.player2_id) # 3rd
-                ranked_ids.append(third_place_match.player1_id) # 4th
-        
-        # Build the final sorted list
-        # Start with the specifically ranked players
-        ko_standings = []
-        for pid in ranked_ids:
-            if pid in player_stats:
-                ko_standings.append(player_stats[pid])
-                
-        # Add the rest, sorted by wins
-        rest_of_players = [p for pid, p in player_stats.items() if pid not in ranked_ids]
-        rest_of_players.sort(key=lambda x: x['wins'], reverse=True)
-        
-        standings = ko_standings + rest_of_players
+    with timed('standings'):
+        if tournament.mode == 'groups':
+            tables = group_tables(tournament.id, snapshot.players.values(), matches)
+            standings = rank_groups(player_stats, matches, tables)
+        else:
+            standings = rank_standings(tournament.mode, player_stats, matches)
 
     # Group matches by round for display, excluding bye matches
     matches_by_round = {}
     match_counter = 1
-    total_matches = 0
-    completed_matches = 0
     
+    # Groups: one card per group with its table and matches, the knockout stage below
+    groups = []
+    if tournament.mode == 'groups':
+        groups_by_number = {}
+        for number in sorted(tables):
+            groups_by_number[number] = {'letter': chr(64 + number), 'table': tables[number],
+                                        'matches': [], 'completed': 0, 'total': 0}
+            groups.append(groups_by_number[number])
+        for match in matches:
+            if match.group_number is None or match.player2_id is None:
+                continue
+            group = groups_by_number[match.group_number]
+            group['matches'].append(match._replace(display_number=match_counter))
+            match_counter += 1
+            group['total'] += 1
+            group['completed'] += 1 if match.completed else 0
+        matches = [m for m in matches if m.group_number is None]
+
     for match in matches:
         # In KO, we show all matches, even placeholders?
         # Yes, for the bracket.
         # But for 'round_robin' view logic, we filtered.
         # Let's keep existing logic for RR.
         
-        if tournament.mode == 'round_robin':
+        if tournament.mode in ('round_robin', 'swiss'):
             if match.player2_id is not None:  # Exclude matches with a bye
-                total_matches += 1
-                if match.completed:
-                    completed_matches += 1
-                    
-                match.display_number = match_counter
+                match = match._replace(display_number=match_counter)
                 match_counter += 1
                 if match.round_number not in matches_by_round:
                     matches_by_round[match.round_number] = []
                 matches_by_round[match.round_number].append(match)
         else:
             # KO Logic: Include all matches
-            total_matches += 1
-            if match.completed:
-                completed_matches += 1
-            match.display_number = match.id # Use ID or something
+            # display_number defaults to the match ID in the snapshot
             if match.round_number not in matches_by_round:
                 matches_by_round[match.round_number] = []
             matches_by_round[match.round_number].append(match)
 
-    # Check if all matches are completed
-    if tournament.mode == 'round_robin':
-        unfinished_matches_count = Match.query.filter_by(
-            tournament_id=tournament.id, completed=False).filter(Match.player2_id != None).count()
+    bracket_sections = bracket_columns(tournament.mode, matches) if tournament.mode not in ('round_robin', 'swiss') else []
+
+    knockout_started = tournament.mode == 'groups' and bool(matches_by_round)
+
+    # Check if all matches are completed, the counters are maintained with every score change
+    all_matches_completed = tournament.completed_matches == tournament.total_matches and tournament.total_matches > 0
+
+    # Swiss: the next round can be paired once the current one is complete
+    swiss_round = max(matches_by_round) if tournament.mode == 'swiss' and matches_by_round else 0
+    swiss_rounds_left = max(0, (tournament.swiss_rounds or 0) - swiss_round) if tournament.mode == 'swiss' else 0
+    next_round_ready = all_matches_completed and swiss_rounds_left > 0
+    all_matches_completed = all_matches_completed and not swiss_rounds_left
+
+    return dict(tournament=tournament, matches_by_round=matches_by_round, standings=standings, all_matches_completed=all_matches_completed, total_matches=tournament.total_matches, completed_matches=tournament.completed_matches,
+                swiss_round=swiss_round, next_round_ready=next_round_ready, bracket_sections=bracket_sections,
+                groups=groups, group_stage_closed=knockout_started)
+
+def render_tournament_page(tournament_id):
+    """Renders the full tournament page. Returns (html, revision the page was rendered from)."""
+    # Finished tournaments never change, their page comes precomputed from one row
+    context = load_frozen_page(tournament_id)
+    if context is None:
+        context = tournament_page_context(tournament_id)
+        if context is None:
+            abort(404)
+    with timed('render'):
+        html = render_template('tournament.html', **context)
+    return html, context['tournament'].revision
+
+def freeze_tournament(tournament_id):
+    """Stores the final page of a finished tournament (see frozen.py). Returns False if it is not finished."""
+    context = tournament_page_context(tournament_id)
+    if context is None or not context['tournament'].is_finished:
+        return False
+    store_frozen_page(context)
+    return True
+
+def freeze_finished_tournaments():
+    """Freezes every finished tournament whose frozen page is missing or outdated. Returns how many."""
+    tournament_ids = stale_frozen_ids()
+    for tournament_id in tournament_ids:
+        freeze_tournament(tournament_id)
+        # Only one tournament in memory at a time
+        db.session.flush()
+        db.session.expunge_all()
+    return len(tournament_ids)
+
+def is_card_match(tournament, match):
+    """True if the page shows the match as a card (round robin, Swiss, group stage), else in the bracket."""
+    return tournament.mode in ('round_robin', 'swiss') or (tournament.mode == 'groups' and match.group_number is not None)
+
+def card_number_offset(tournament, match):
+    """How many cards the tournament page numbers before this match (see render_tournament_page)."""
+    query = db.session.query(func.count(Match.id)).filter(
+        Match.tournament_id == tournament.id, Match.player2_id != None,
+        or_(Match.round_number < match.round_number, and_(Match.round_number == match.round_number, Match.id < match.id)))
+    if tournament.mode == 'groups':
+        query = query.filter(Match.group_number != None)
+    return query.scalar()
+
+def render_fragment(key, part, tournament, **context):
+    """
+    Renders one part of the tournament page, cached under `key`. The keys hold the data the
+    part is rendered from, so a score change only misses for the parts showing that match.
+    """
+    html = fragment_cache.get(key)
+    if html is None:
+        with timed('render'):
+            html = render_template('fragment.html', part=part, tournament=tournament, **context)
+        fragment_cache.set(key, html)
+    return html
+
+@main.route('/tournament/<int:tournament_id>/fragment/match/<int:match_id>')
+def match_fragment(tournament_id, match_id):
+    """One match as shown on the tournament page (card or bracket box), empty for byes."""
+    loaded = load_match_views(tournament_id, Match.id == match_id)
+    if loaded is None or not loaded[1]:
+        abort(404)
+    tournament, (match,) = loaded
+    closed = tournament.mode == 'groups' and knockout_stage_exists(tournament_id)
+    if is_card_match(tournament, match):
+        if match.player2_id is None:
+            return ''
+        match = match._replace(display_number=card_number_offset(tournament, match) + 1)
+        part = 'match_card'
     else:
-        # KO: All matches must be completed
-        unfinished_matches_count = Match.query.filter_by(
-            tournament_id=tournament.id, completed=False).count()
-            
-    all_matches_completed = (unfinished_matches_count ==
-                             0) and (len(matches) > 0)
+        if match.is_bye:
+            return ''
+        part = 'bracket_match'
+    key = ('match', tournament.mode, tournament.is_finished, closed, match)
+    return render_fragment(key, part, tournament, match=match, group_stage_closed=closed)
+
+@main.route('/tournament/<int:tournament_id>/fragment/round/<round_key>')
+def round_fragment(tournament_id, round_key):
+    """
+    One round as shown on the tournament page: for round robin and Swiss the round number,
+    for the bracket modes the column key (e.g. K2, or W3/L4/G7/R8 in double elimination).
+    """
+    if round_key.isdigit():
+        loaded = load_match_views(tournament_id, Match.round_number == int(round_key), Match.player2_id != None)
+        if loaded is None or loaded[0].mode not in ('round_robin', 'swiss') or not loaded[1]:
+            abort(404)
+        tournament, matches = loaded
+        offset = card_number_offset(tournament, matches[0])
+        matches = [match._replace(display_number=offset + number) for number, match in enumerate(matches, start=1)]
+        key = ('round', tournament.mode, tournament.is_finished, tuple(matches))
+        return render_fragment(key, 'card_round', tournament, round_num=int(round_key), matches=matches,
+                               group_stage_closed=False)
+
+    loaded = load_match_views(tournament_id, Match.group_number == None)
+    if loaded is None or loaded[0].mode in ('round_robin', 'swiss'):
+        abort(404)
+    tournament, matches = loaded
+    columns = [column for _, section in bracket_columns(tournament.mode, matches) for column in section]
+    column = next((column for column in columns if column['key'] == round_key), None)
+    if column is None:
+        abort(404)
+    key = ('round', tournament.mode, tournament.is_finished, column['key'], column['title'], tuple(column['matches']))
+    return render_fragment(key, 'bracket_column', tournament, column=column, group_stage_closed=False)
 
-    return render_template('tournament.html', tournament=tournament, matches_by_round=matches_by_round, standings=standings, all_matches_completed=all_matches_completed, total_matches=total_matches, completed_matches=completed_matches)
+@main.route('/tournament/<int:tournament_id>/fragment/standings')
+def standings_fragment(tournament_id):
+    """The standings table of the tournament page."""
+    revision = current_revision(tournament_id)
+    if revision is None:
+        abort(404)
+    # Any result changes the standings, so they are cached per revision
+    key = ('standings', tournament_id, revision)
+    html = fragment_cache.get(key)
+    if html is None:
+        snapshot = load_tournament_snapshot(tournament_id)
+        tournament = snapshot.tournament
+        with timed('standings'):
+            standings = rank_standings(tournament.mode, snapshot.player_stats, snapshot.matches)
+        html = render_fragment(key, 'standings', tournament, standings=standings, group_stage_closed=False)
+    return html
 
 @main.route('/finish_tournament/<int:tournament_id>', methods=['POST'])
 def finish_tournament(tournament_id):
     tournament = Tournament.query.get_or_404(tournament_id)
-    # Check if all matches are completed (excluding byes)
-    unfinished_matches = Match.query.filter_by(
-        tournament_id=tournament.id, completed=False).filter(Match.player2_id != None).count()
-
-    if unfinished_matches == 0:
+    # Check if all matches are completed (excluding byes) and, in Swiss mode, all rounds are paired
+    if tournament.open_matches == 0 and tournament.total_matches > 0 and not swiss_rounds_remaining(tournament):
         tournament.is_finished = True
+        bump_revision(tournament.id)
+        db.session.commit()
+        freeze_tournament(tournament.id)
         db.session.commit()
+        publish_tournament_event(tournament.id, 'tournament_finished')
 
     return redirect(url_for('main.tournament_view', tournament_id=tournament.id))
+
+def boards_to_dict(snapshot):
+    """JSON representation of the board assignment of a tournament."""
+    on_board, waiting = board_queue(snapshot.matches)
+    return {
+        'revision': snapshot.tournament.revision,
+        'boards': [{'board': board, 'match': match_to_dict(on_board[board]) if board in on_board else None}
+                   for board in range(1, (snapshot.tournament.boards or 0) + 1)],
+        'queue': [dict(match_to_dict(match), ready=ready) for match, ready in waiting],
+    }
+
+@main.route('/api/tournament/<int:tournament_id>/boards', methods=['GET', 'POST'])
+def api_boards(tournament_id):
+    """
+    GET: the match called to every board and the queue of waiting matches.
+    POST {"boards": n}: changes the number of boards, free boards are filled right away.
+    """
+    if request.method == 'POST':
+        tournament = Tournament.query.get_or_404(tournament_id)
+        if tournament.is_finished:
+            return jsonify(error='Das Turnier ist bereits beendet.'), 409
+        payload = request.get_json(silent=True) or {}
+        boards = payload.get('boards')
+        if not isinstance(boards, int) or isinstance(boards, bool) or boards < 0:
+            return jsonify(error='Anzahl der Boards fehlt oder ist ungültig.'), 400
+        tournament.boards = boards or None
+        changed_ids = assign_boards(tournament_id)
+        bump_revision(tournament_id, board_ids=changed_ids)
+        db.session.commit()
+        publish_tournament_event(tournament_id, 'boards_changed', changed_ids)
+
+    snapshot = load_tournament_snapshot(tournament_id)
+    if snapshot is None:
+        abort(404)
+    return jsonify(boards_to_dict(snapshot))
+
+@main.route('/tournament/<int:tournament_id>/boards')
+def board_display(tournament_id):
+    """Hall display: which match is next on which board, updated live."""
+    snapshot = load_tournament_snapshot(tournament_id)
+    if snapshot is None:
+        abort(404)
+    on_board, waiting = board_queue(snapshot.matches)
+    return render_template('boards.html', tournament=snapshot.tournament, on_board=on_board, waiting=waiting)
+
+@main.route('/api/players/suggest')
+def api_player_suggestions():
+    """Known players whose name starts with ?q=, most frequent and most recent first (at most ?limit=)."""
+    limit = min(max(request.args.get('limit', current_app.config['PLAYER_SUGGESTIONS'], type=int), 1), 50)
+    profiles = suggest_players(request.args.get('q', ''), limit)
+    return jsonify(players=[{'name': profile.name, 'tournaments': profile.tournaments,
+                             'last_played': profile.last_played.isoformat() if profile.last_played else None}
+                            for profile in profiles])
+
+@main.route('/ratings')
+def ratings():
+    """Ranking of all players across tournaments, read from the profiles only."""
+    profiles = PlayerProfile.query.filter(PlayerProfile.matches > 0).order_by(PlayerProfile.rating.desc()).all()
+    return render_template('ratings.html', profiles=profiles)
+
+def export_tournament_ids():
+    """Tournaments selected with ?tournament_id=1&tournament_id=2, None for all."""
+    ids = request.args.getlist('tournament_id', type=int)
+    return ids or None
+
+@main.route('/export.ndjson')
+def export_archive():
+    """All tournaments with players, matches and standings, streamed as NDJSON."""
+    filename = 'adarts-%s.ndjson' % datetime.now().strftime('%Y-%m-%d')
+    return Response(stream_with_context(export_ndjson(export_tournament_ids())), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=%s' % filename})
+
+@main.route('/export/<kind>.csv')
+def export_archive_csv(kind):
+    """One kind of record (tournament, player, match, standing) of all tournaments, streamed as CSV."""
+    if kind not in ARCHIVE_MODELS:
+        abort(404)
+    filename = 'adarts-%s-%s.csv' % (kind, datetime.now().strftime('%Y-%m-%d'))
+    return Response(stream_with_context(export_csv(kind, export_tournament_ids())), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=%s' % filename})
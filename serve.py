@@ -0,0 +1,77 @@
+"""
+Production entry point: python serve.py
+
+Serves the app with waitress (pure Python, also runs on Windows) in WORKERS processes
+with THREADS threads each, all accepting on one shared listening socket. The schema is
+set up once here before the workers start. Settings come from the environment like in
+create_app(), e.g. ADARTS_PORT=8000 ADARTS_WORKERS=4 python serve.py
+
+SQLite is shared safely between the processes through WAL mode, the busy timeout and
+BEGIN IMMEDIATE for writes (see configure_sqlite). Every process has its own page cache
+(keyed by revision, so never stale) and its own live-update broadcaster; displays
+connected to another worker notice changes through the revision check (SSE_POLL_SECONDS).
+"""
+import multiprocessing
+import signal
+import socket
+
+from waitress import serve
+
+from app import create_app, init_database
+from models import db
+
+def bind_socket(host, port):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    return sock
+
+def run_worker(sock, threads, managed=True):
+    if managed:
+        # Ctrl+C is handled by the parent, which stops all workers
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Every worker builds its own app, engine and connection pool after the fork
+    app = create_app()
+    serve(app, sockets=[sock], threads=threads, ident='adarts', outbuf_overflow=app.config['OUTBUF_OVERFLOW'])
+
+def main():
+    app = create_app()
+    init_database(app)
+    with app.app_context():
+        # No connections may be inherited by the workers
+        db.engine.dispose()
+
+    host, port = app.config['HOST'], app.config['PORT']
+    workers, threads = max(1, app.config['WORKERS']), max(1, app.config['THREADS'])
+    sock = bind_socket(host, port)
+    print(f'A-Darts Turnier Manager auf http://{host}:{port} ({workers} Prozess(e) mit je {threads} Threads)')
+
+    if workers == 1:
+        run_worker(sock, threads, managed=False)
+        return
+
+    processes = [multiprocessing.Process(target=run_worker, args=(sock, threads), daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+        sock.close()
+
+if __name__ == '__main__':
+    main()
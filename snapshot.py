@@ -0,0 +1,105 @@
+from collections import namedtuple
+from sqlalchemy.orm import selectinload
+from models import Tournament, Player, Match
+
+# Read-only views handed to routes and templates. They carry plain values only,
+# so rendering a page can never trigger a lazy load.
+PlayerView = namedtuple('PlayerView', ['id', 'name', 'group_number'])
+MatchView = namedtuple('MatchView', [
+    'id', 'tournament_id', 'round_number', 'player1_id', 'player2_id', 'player1', 'player2',
+    'score_player1', 'score_player2', 'completed', 'is_third_place', 'is_bye',
+    'next_match_id', 'next_match_slot', 'loser_next_match_id', 'loser_next_match_slot',
+    'bracket', 'group_number', 'board', 'display_number', 'version'])
+TournamentView = namedtuple('TournamentView', ['id', 'name', 'mode', 'is_finished', 'date_created', 'revision',
+                                               'total_matches', 'completed_matches', 'swiss_rounds',
+                                               'group_count', 'group_advance', 'boards'])
+TournamentSnapshot = namedtuple('TournamentSnapshot', ['tournament', 'players', 'matches', 'player_stats'])
+
+def load_tournament_snapshot(tournament_id):
+    """
+    Loads a tournament with all of its players, matches and standings in a fixed
+    number of queries (one for the tournament, one selectin per collection),
+    independent of the tournament size. Returns None if the tournament does not exist.
+    """
+    tournament = Tournament.query.options(
+        selectinload(Tournament.players),
+        selectinload(Tournament.matches),
+        selectinload(Tournament.standings),
+    ).filter_by(id=tournament_id).first()
+    if tournament is None:
+        return None
+
+    players = {p.id: player_to_view(p) for p in tournament.players if p.name != "BYE_PLAYER_DUMMY"}
+    matches = [match_to_view(m, players) for m in sorted(tournament.matches, key=lambda m: (m.round_number, m.id))]
+    player_stats = {s.player_id: s.to_stats(players.get(s.player_id))
+                    for s in tournament.standings if s.player_id in players}
+    return TournamentSnapshot(tournament_to_view(tournament), players, matches, player_stats)
+
+def load_match_views(tournament_id, *criteria):
+    """
+    Loads only the matches matching the given filter criteria (e.g. one round or one match)
+    and their players, for rendering a part of the tournament page.
+    Returns (TournamentView, [MatchView] ordered like the page) or None.
+    """
+    tournament = Tournament.query.get(tournament_id)
+    if tournament is None:
+        return None
+    rows = Match.query.filter(Match.tournament_id == tournament_id, *criteria).order_by(Match.round_number, Match.id).all()
+    player_ids = {pid for m in rows for pid in (m.player1_id, m.player2_id) if pid}
+    players = {p.id: player_to_view(p) for p in Player.query.filter(Player.id.in_(player_ids))} if player_ids else {}
+    return tournament_to_view(tournament), [match_to_view(m, players) for m in rows]
+
+def player_to_view(player):
+    return PlayerView(player.id, player.name, player.group_number)
+
+def match_to_view(m, players):
+    return MatchView(
+        id=m.id, tournament_id=m.tournament_id, round_number=m.round_number,
+        player1_id=m.player1_id, player2_id=m.player2_id,
+        player1=players.get(m.player1_id), player2=players.get(m.player2_id),
+        score_player1=m.score_player1, score_player2=m.score_player2,
+        completed=bool(m.completed), is_third_place=bool(m.is_third_place), is_bye=bool(m.is_bye),
+        next_match_id=m.next_match_id, next_match_slot=m.next_match_slot,
+        loser_next_match_id=m.loser_next_match_id, loser_next_match_slot=m.loser_next_match_slot,
+        bracket=m.bracket, group_number=m.group_number, board=m.board, version=m.version, display_number=m.id)
+
+def tournament_to_view(tournament):
+    return TournamentView(tournament.id, tournament.name, tournament.mode,
+                          bool(tournament.is_finished), tournament.date_created, tournament.revision,
+                          tournament.total_matches, tournament.completed_matches, tournament.swiss_rounds,
+                          tournament.group_count, tournament.group_advance, tournament.boards)
+
+def match_to_dict(match):
+    """Compact JSON representation of a MatchView."""
+    return {
+        'id': match.id,
+        'round_number': match.round_number,
+        'player1_id': match.player1_id,
+        'player1': match.player1.name if match.player1 else None,
+        'player2_id': match.player2_id,
+        'player2': match.player2.name if match.player2 else None,
+        'score_player1': match.score_player1,
+        'score_player2': match.score_player2,
+        'completed': match.completed,
+        'is_third_place': match.is_third_place,
+        'is_bye': match.is_bye,
+        'bracket': match.bracket,
+        'group_number': match.group_number,
+        'board': match.board,
+        'version': match.version,
+    }
+
+def standings_to_list(standings):
+    """Compact JSON representation of ranked standings (as returned by rank_standings)."""
+    return [{
+        'rank': rank,
+        'player_id': row['player'].id,
+        'name': row['player'].name,
+        'points': row['points'],
+        'wins': row['wins'],
+        'draws': row['draws'],
+        'losses': row['losses'],
+        'legs_won': row['legs_won'],
+        'legs_lost': row['legs_lost'],
+        'open_matches': row['open_matches'],
+    } for rank, row in enumerate(standings, start=1)]
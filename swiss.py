@@ -0,0 +1,128 @@
+import math
+
+def default_swiss_rounds(n_players):
+    """Rounds needed to find a single winner: ceil(log2(n)), at least 1, at most n - 1."""
+    if n_players < 2:
+        return 0
+    return max(1, min(n_players - 1, math.ceil(math.log2(n_players))))
+
+def choose_bye(ranked_ids, byes):
+    """Lowest ranked player without a bye so far (the lowest ranked one if everybody had one)."""
+    for player_id in reversed(ranked_ids):
+        if player_id not in byes:
+            return player_id
+    return ranked_ids[-1]
+
+def _preference(i, size):
+    """Positions in the bottom half in the order top player i wants them: i, i+1, i-1, i+2, ..."""
+    yield i
+    for distance in range(1, size):
+        if i + distance < size:
+            yield i + distance
+        if i - distance >= 0:
+            yield i - distance
+
+def _pair_bracket(bracket, played):
+    """
+    Pairs one score group (plus the players floated down into it) Dutch style: the top half
+    meets the bottom half, top[i] preferably bottom[i]. Rematches are avoided with a maximum
+    bipartite matching (Kuhn's augmenting paths over the preference order), so one forbidden
+    pairing only shifts its neighbours instead of forcing a search over all permutations.
+    Players that stay unpaired are tried against each other and otherwise float down.
+    Returns (pairs, floaters).
+    """
+    half = len(bracket) // 2
+    top, bottom = bracket[:half], bracket[half:]
+    partner_of_bottom = {}
+
+    def augment(i, seen):
+        for j in _preference(i, len(bottom)):
+            if j in seen or frozenset((top[i], bottom[j])) in played:
+                continue
+            seen.add(j)
+            if j not in partner_of_bottom or augment(partner_of_bottom[j], seen):
+                partner_of_bottom[j] = i
+                return True
+        return False
+
+    for i in range(len(top)):
+        augment(i, set())
+
+    pairs = [(top[i], bottom[j]) for j, i in partner_of_bottom.items()]
+    paired = {player_id for pair in pairs for player_id in pair}
+    rest = [player_id for player_id in bracket if player_id not in paired]
+
+    floaters = []
+    while rest:
+        player_id = rest.pop(0)
+        opponent = next((other for other in rest if frozenset((player_id, other)) not in played), None)
+        if opponent is None:
+            floaters.append(player_id)
+        else:
+            rest.remove(opponent)
+            pairs.append((player_id, opponent))
+    return pairs, floaters
+
+def _repair(leftovers, pairs, played):
+    """
+    Pairs the players left over at the bottom of the field. If two of them already met,
+    they are swapped into an existing pair (searched from the bottom up) so that both new
+    pairings are new. Only if no such swap exists a rematch is accepted.
+    """
+    while len(leftovers) >= 2:
+        a = leftovers.pop(0)
+        b = next((other for other in leftovers if frozenset((a, other)) not in played), None)
+        if b is not None:
+            leftovers.remove(b)
+            pairs.append((a, b))
+            continue
+
+        b = leftovers.pop(0)
+        for index in range(len(pairs) - 1, -1, -1):
+            c, d = pairs[index]
+            if frozenset((a, c)) not in played and frozenset((b, d)) not in played:
+                pairs[index:index + 1] = [(c, a), (d, b)]
+                break
+            if frozenset((a, d)) not in played and frozenset((b, c)) not in played:
+                pairs[index:index + 1] = [(c, b), (d, a)]
+                break
+        else:
+            pairs.append((a, b))
+    return pairs
+
+def pair_swiss_round(ranked_ids, points, played, byes=()):
+    """
+    Pairs the next Swiss round.
+
+    ranked_ids: player IDs, best first (the order of sort_standings)
+    points:     {player_id: points}, players with equal points form a score group
+    played:     set of frozenset({player_id, opponent_id}) of all earlier pairings
+    byes:       players that already had a bye
+
+    Score groups are paired from the top down, unpaired players float into the next
+    group. Runs in roughly O(n * k) for n players in score groups of size k, a field of
+    a few hundred players is paired in milliseconds.
+    Returns (pairs, bye_player_id), the higher ranked player of a pair first.
+    """
+    ranked_ids = list(ranked_ids)
+    bye_id = None
+    if len(ranked_ids) % 2:
+        bye_id = choose_bye(ranked_ids, set(byes))
+        ranked_ids.remove(bye_id)
+
+    rank = {player_id: index for index, player_id in enumerate(ranked_ids)}
+    pairs = []
+    floaters = []
+    start = 0
+    while start < len(ranked_ids):
+        end = start
+        while end < len(ranked_ids) and points.get(ranked_ids[end], 0) == points.get(ranked_ids[start], 0):
+            end += 1
+        bracket_pairs, floaters = _pair_bracket(floaters + ranked_ids[start:end], played)
+        pairs.extend(bracket_pairs)
+        start = end
+
+    pairs = _repair(floaters, pairs, played)
+    pairs = [tuple(sorted(pair, key=rank.get)) for pair in pairs]
+    pairs.sort(key=lambda pair: rank[pair[0]])
+    return pairs, bye_id
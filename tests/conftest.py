@@ -0,0 +1,50 @@
+import pytest
+from app import create_app, init_database
+from models import db, Match
+from cache import page_cache, group_cache, fragment_cache
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s' % (tmp_path / 'test.db')})
+    init_database(app)
+    # The caches are per process and keyed by tournament ID, which every test database reuses
+    for cache in (page_cache, group_cache, fragment_cache):
+        cache.clear()
+    yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def create_tournament(client):
+    """Creates a tournament through the form and returns its ID."""
+    def create(mode='round_robin', players=4, **form):
+        names = players if isinstance(players, (list, tuple)) else ['Spieler %d' % i for i in range(1, players + 1)]
+        data = dict(tournament_name='Test', tournament_mode=mode, player_names='\n'.join(names), **form)
+        response = client.post('/create_tournament', data=data)
+        assert response.status_code == 302
+        return int(response.headers['Location'].rsplit('/', 1)[1])
+    return create
+
+
+@pytest.fixture
+def play_open_matches(app, client):
+    """Enters 3:1 for player 1 in every playable match of a tournament until none is left."""
+    def play(tournament_id):
+        played = set()
+        while True:
+            with app.app_context():
+                open_ids = [match_id for (match_id,) in db.session.query(Match.id).filter(
+                    Match.tournament_id == tournament_id, Match.completed == False,
+                    Match.player1_id != None, Match.player2_id != None).order_by(Match.round_number, Match.id)]
+            if not open_ids:
+                return
+            assert played.isdisjoint(open_ids), 'results were not stored'
+            played.update(open_ids)
+            for match_id in open_ids:
+                client.post('/update_score/%d' % match_id, data={'score_player1': 3, 'score_player2': 1})
+    return play
@@ -0,0 +1,97 @@
+import csv
+import json
+import pytest
+from sqlalchemy import event
+from archive import export_csv, export_ndjson, import_ndjson
+from models import db, Tournament, Match
+
+
+def export_lines(app):
+    with app.app_context():
+        return list(export_ndjson())
+
+
+def test_import_restores_the_export_next_to_existing_tournaments(app, client, create_tournament):
+    tournament_id = create_tournament(players=4)
+    with app.app_context():
+        match_id = Match.query.filter_by(tournament_id=tournament_id).first().id
+    client.post('/update_score/%d' % match_id, data={'score_player1': 3, 'score_player2': 1})
+    lines = export_lines(app)
+    with app.app_context():
+        counts = import_ndjson(lines)
+        assert counts == {'tournament': 1, 'player': 4, 'match': 6, 'standing': 4}
+        assert Tournament.query.count() == 2
+        copy = Match.query.filter(Match.tournament_id != tournament_id, Match.completed == True).one()
+        assert (copy.score_player1, copy.score_player2) == (3, 1)
+
+
+@pytest.mark.parametrize('change, message', [
+    (lambda record: record.update(id='7'), 'Zeile 2: id muss eine ganze Zahl sein'),
+    (lambda record: record.update(id=None), 'Zeile 2: id fehlt'),
+    (lambda record: record.pop('tournament_id'), 'Zeile 2: tournament_id fehlt'),
+    (lambda record: record.update(type=['player']), 'Zeile 2: unbekannter Typ'),
+])
+def test_malformed_player_record_raises_value_error(app, create_tournament, change, message):
+    create_tournament(players=2)
+    lines = export_lines(app)
+    record = json.loads(lines[1])
+    assert record['type'] == 'player'
+    change(record)
+    lines[1] = json.dumps(record)
+    with app.app_context():
+        with pytest.raises(ValueError, match=message):
+            import_ndjson(lines)
+        assert Tournament.query.count() == 1
+
+
+def test_non_integer_score_raises_value_error(app, create_tournament):
+    create_tournament(players=2)
+    lines = export_lines(app)
+    number, record = next((number, json.loads(line)) for number, line in enumerate(lines, start=1)
+                          if json.loads(line)['type'] == 'match')
+    record['score_player1'] = 'drei'
+    lines[number - 1] = json.dumps(record)
+    with app.app_context():
+        with pytest.raises(ValueError, match='Zeile %d: score_player1' % number):
+            import_ndjson(lines)
+
+
+def test_line_that_is_no_object_raises_value_error(app):
+    with app.app_context():
+        with pytest.raises(ValueError, match='Zeile 1 ist kein gültiger Datensatz'):
+            import_ndjson(['[1, 2]\n'])
+
+
+def csv_export(app, kind):
+    """Parsed CSV export of one kind and the SQL statements it took."""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            rows = list(csv.DictReader(export_csv(kind)))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+    return rows, statements
+
+
+@pytest.mark.parametrize('kind, count', [('tournament', 3), ('player', 12), ('match', 18)])
+def test_csv_export_reads_only_its_own_table(app, create_tournament, kind, count):
+    for _ in range(3):
+        create_tournament(players=4)
+    rows, statements = csv_export(app, kind)
+    assert len(rows) == count
+    assert [row['id'] for row in rows] == [str(number) for number in range(1, count + 1)]
+    assert len([statement for statement in statements if statement.startswith('SELECT')]) == 1
+
+
+def test_csv_export_of_standings_has_the_final_rank(app, client, create_tournament):
+    tournament_id = create_tournament(players=2)
+    with app.app_context():
+        match_id = Match.query.filter_by(tournament_id=tournament_id).one().id
+    client.post('/update_score/%d' % match_id, data={'score_player1': 1, 'score_player2': 3})
+    rows, _ = csv_export(app, 'standing')
+    assert [(row['player_id'], row['rank']) for row in sorted(rows, key=lambda row: row['rank'])] == [('2', '1'), ('1', '2')]
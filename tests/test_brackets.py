@@ -0,0 +1,117 @@
+import random
+import pytest
+from models import db, Tournament, Player, Match
+from utils import generate_knockout_schedule
+
+# Stored brackets of the original generator (one ORM insert per match, byes advanced
+# afterwards) for random.seed(n) and the players S1..Sn. Rows are ordered by round, 3rd
+# place match last, then ID: (round, position in the round, 3rd place, player 1, player 2,
+# completed, next match, loser's next match), links as (round, 3rd place, position, slot).
+EXPECTED = {
+    2: [
+        (1, 0, False, 'S2', 'S1', False, None, None),
+    ],
+    3: [
+        # Without the 3rd place match, which could only ever get the loser of S2 - S3
+        (1, 0, False, 'S2', 'S3', False, (2, False, 0, 1), None),
+        (1, 1, False, 'S1', None, True, (2, False, 0, 2), None),
+        (2, 0, False, None, 'S1', False, None, None),
+    ],
+    5: [
+        (1, 0, False, 'S1', 'S2', False, (2, False, 0, 1), None),
+        (1, 1, False, 'S4', None, True, (2, False, 0, 2), None),
+        (1, 2, False, 'S3', None, True, (2, False, 1, 1), None),
+        (1, 3, False, 'S5', None, True, (2, False, 1, 2), None),
+        (2, 0, False, None, 'S4', False, (3, False, 0, 1), (3, True, 0, 1)),
+        (2, 1, False, 'S3', 'S5', False, (3, False, 0, 2), (3, True, 0, 2)),
+        (3, 0, False, None, None, False, None, None),
+        (3, 0, True, None, None, False, None, None),
+    ],
+    8: [
+        (1, 0, False, 'S6', 'S1', False, (2, False, 0, 1), None),
+        (1, 1, False, 'S7', 'S5', False, (2, False, 0, 2), None),
+        (1, 2, False, 'S2', 'S8', False, (2, False, 1, 1), None),
+        (1, 3, False, 'S3', 'S4', False, (2, False, 1, 2), None),
+        (2, 0, False, None, None, False, (3, False, 0, 1), (3, True, 0, 1)),
+        (2, 1, False, None, None, False, (3, False, 0, 2), (3, True, 0, 2)),
+        (3, 0, False, None, None, False, None, None),
+        (3, 0, True, None, None, False, None, None),
+    ],
+    11: [
+        (1, 0, False, 'S1', 'S4', False, (2, False, 0, 1), None),
+        (1, 1, False, 'S3', 'S6', False, (2, False, 0, 2), None),
+        (1, 2, False, 'S2', 'S7', False, (2, False, 1, 1), None),
+        (1, 3, False, 'S5', None, True, (2, False, 1, 2), None),
+        (1, 4, False, 'S10', None, True, (2, False, 2, 1), None),
+        (1, 5, False, 'S11', None, True, (2, False, 2, 2), None),
+        (1, 6, False, 'S9', None, True, (2, False, 3, 1), None),
+        (1, 7, False, 'S8', None, True, (2, False, 3, 2), None),
+        (2, 0, False, None, None, False, (3, False, 0, 1), None),
+        (2, 1, False, None, 'S5', False, (3, False, 0, 2), None),
+        (2, 2, False, 'S10', 'S11', False, (3, False, 1, 1), None),
+        (2, 3, False, 'S9', 'S8', False, (3, False, 1, 2), None),
+        (3, 0, False, None, None, False, (4, False, 0, 1), (4, True, 0, 1)),
+        (3, 1, False, None, None, False, (4, False, 0, 2), (4, True, 0, 2)),
+        (4, 0, False, None, None, False, None, None),
+        (4, 0, True, None, None, False, None, None),
+    ],
+    16: [
+        (1, 0, False, 'S11', 'S9', False, (2, False, 0, 1), None),
+        (1, 1, False, 'S13', 'S2', False, (2, False, 0, 2), None),
+        (1, 2, False, 'S3', 'S6', False, (2, False, 1, 1), None),
+        (1, 3, False, 'S10', 'S16', False, (2, False, 1, 2), None),
+        (1, 4, False, 'S1', 'S14', False, (2, False, 2, 1), None),
+        (1, 5, False, 'S4', 'S7', False, (2, False, 2, 2), None),
+        (1, 6, False, 'S5', 'S15', False, (2, False, 3, 1), None),
+        (1, 7, False, 'S8', 'S12', False, (2, False, 3, 2), None),
+        (2, 0, False, None, None, False, (3, False, 0, 1), None),
+        (2, 1, False, None, None, False, (3, False, 0, 2), None),
+        (2, 2, False, None, None, False, (3, False, 1, 1), None),
+        (2, 3, False, None, None, False, (3, False, 1, 2), None),
+        (3, 0, False, None, None, False, (4, False, 0, 1), (4, True, 0, 1)),
+        (3, 1, False, None, None, False, (4, False, 0, 2), (4, True, 0, 2)),
+        (4, 0, False, None, None, False, None, None),
+        (4, 0, True, None, None, False, None, None),
+    ],
+}
+
+
+def bracket_rows(tournament_id):
+    matches = Match.query.filter_by(tournament_id=tournament_id).all()
+    ordered = sorted(matches, key=lambda m: (m.round_number, bool(m.is_third_place), m.id))
+    by_id = {m.id: m for m in matches}
+    position = {}
+    counters = {}
+    for match in ordered:
+        key = (match.round_number, bool(match.is_third_place))
+        position[match.id] = counters.get(key, 0)
+        counters[key] = position[match.id] + 1
+    names = {p.id: p.name for p in Player.query.filter_by(tournament_id=tournament_id)}
+
+    def link(match_id, slot):
+        if match_id is None:
+            return None
+        return (by_id[match_id].round_number, bool(by_id[match_id].is_third_place), position[match_id], slot)
+
+    return [(m.round_number, position[m.id], bool(m.is_third_place), names.get(m.player1_id), names.get(m.player2_id),
+             bool(m.completed), link(m.next_match_id, m.next_match_slot),
+             link(m.loser_next_match_id, m.loser_next_match_slot)) for m in ordered]
+
+
+@pytest.mark.parametrize('n_players', sorted(EXPECTED))
+def test_knockout_bracket_matches_the_original_generator(app, n_players):
+    with app.app_context():
+        tournament = Tournament(name='K.O. %d' % n_players, mode='knockout')
+        db.session.add(tournament)
+        db.session.flush()
+        players = [Player(name='S%d' % i, tournament_id=tournament.id) for i in range(1, n_players + 1)]
+        db.session.add_all(players)
+        db.session.flush()
+        random.seed(n_players)
+        generate_knockout_schedule(tournament.id, players)
+        db.session.commit()
+        assert bracket_rows(tournament.id) == EXPECTED[n_players]
+        # Byes are marked as such and never count as played matches
+        byes = Match.query.filter_by(tournament_id=tournament.id, is_bye=True).all()
+        assert all(m.player2_id is None and m.completed for m in byes)
+        assert len(byes) == 2 ** (n_players - 1).bit_length() - n_players
@@ -0,0 +1,27 @@
+from sqlalchemy import event
+from models import db, Player, Match
+
+
+def test_players_are_stored_with_one_insert_in_name_order(app, client):
+    names = ['Zoe', 'Anna', 'Ben', 'Carl', 'Dora', 'Emil']
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        client.post('/create_tournament', data=dict(tournament_name='Test', tournament_mode='round_robin',
+                                                    player_names='\n'.join(names)))
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    assert len([s for s in statements if s.startswith('INSERT INTO player ')]) == 1
+    # No refresh of single players before the schedule is generated
+    assert not [s for s in statements if 'WHERE player.id = ?' in s]
+    with app.app_context():
+        assert [player.name for player in Player.query.order_by(Player.id)] == names
+        first = Match.query.order_by(Match.id).first()
+        assert (first.player1.name, first.player2.name) == ('Zoe', 'Emil')
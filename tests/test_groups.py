@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+import pytest
+from models import db, Tournament, Match
+from utils import build_knockout_bracket, seed_group_qualifiers
+
+
+def qualifier_tables(groups, advance):
+    """Group tables with players named W1, R1, ... (winner/runner-up of group 1), better groups first."""
+    tables = {}
+    for number in range(1, groups + 1):
+        tables[number] = [{'player': SimpleNamespace(id=10 * number + position, name='%s%d' % ('WR'[position], number),
+                                                     group_number=number),
+                           'points': 10 - 3 * position - number, 'legs_won': 0, 'legs_lost': 0}
+                          for position in range(advance)]
+    return tables
+
+
+def second_round(slots):
+    """Round 2 as name pairs, a match still waiting for a round 1 winner shows '?'."""
+    rows = build_knockout_bracket(1, slots, 1)
+    names = {player.id: player.name for player in slots if player is not None}
+    return [(names.get(row['player1_id'], '?'), names.get(row['player2_id'], '?'))
+            for row in rows if row['round_number'] == 2 and not row['is_third_place']]
+
+
+def test_three_qualifiers_get_a_bye_and_no_third_place_match(app, client, create_tournament, play_open_matches):
+    tournament_id = create_tournament(mode='groups', players=6, group_count=3, group_advance=1)
+    play_open_matches(tournament_id)
+    with app.app_context():
+        knockout = Match.query.filter_by(tournament_id=tournament_id, group_number=None).all()
+        assert not any(match.is_third_place for match in knockout)
+        assert sum(1 for match in knockout if match.is_bye) == 1
+        tournament = db.session.get(Tournament, tournament_id)
+        # 3 group matches, the semifinal and the final
+        assert (tournament.total_matches, tournament.completed_matches) == (5, 5)
+
+    client.post('/finish_tournament/%d' % tournament_id)
+    with app.app_context():
+        assert db.session.get(Tournament, tournament_id).is_finished
+
+
+@pytest.mark.parametrize('groups, advance, first_round, round_two', [
+    # Seeds 1 and 2 get the byes and sit in different halves
+    (3, 2, ['W1', None, 'R1', 'R3', 'W2', None, 'W3', 'R2'], [('W1', '?'), ('W2', '?')]),
+    # Three byes: seeds 2 and 3 meet in round 2, seed 1 waits for 4 against 5
+    (5, 1, ['W1', None, 'W4', 'W5', 'W2', None, 'W3', None], [('W1', '?'), ('W2', 'W3')]),
+    (2, 2, ['W1', 'R2', 'W2', 'R1'], [('?', '?')]),
+])
+def test_qualifiers_are_seeded_in_standard_bracket_order(groups, advance, first_round, round_two):
+    slots = seed_group_qualifiers(qualifier_tables(groups, advance), advance)
+    assert [player.name if player is not None else None for player in slots] == first_round
+    assert second_round(slots) == round_two
@@ -0,0 +1,43 @@
+from models import db, Tournament, Match
+from utils import rebuild_counters
+
+
+def finish(app, client, tournament_id):
+    client.post('/finish_tournament/%d' % tournament_id)
+    with app.app_context():
+        return db.session.get(Tournament, tournament_id).is_finished
+
+
+def test_three_player_knockout_can_be_finished(app, client, create_tournament, play_open_matches):
+    tournament_id = create_tournament(mode='knockout', players=3)
+    play_open_matches(tournament_id)
+    with app.app_context():
+        tournament = db.session.get(Tournament, tournament_id)
+        assert (tournament.total_matches, tournament.completed_matches) == (2, 2)
+        assert Match.query.filter_by(tournament_id=tournament_id, is_third_place=True).count() == 0
+    assert finish(app, client, tournament_id)
+
+
+def test_rebuilt_counters_skip_an_orphaned_third_place_match(app, client, create_tournament, play_open_matches):
+    tournament_id = create_tournament(mode='knockout', players=3)
+    with app.app_context():
+        # A bracket as it was stored before: the 3rd place match is fed by both semifinals,
+        # one of them a bye, and counts as a match to be played
+        semifinals = Match.query.filter_by(tournament_id=tournament_id, round_number=1).order_by(Match.id).all()
+        third_place = Match(tournament_id=tournament_id, round_number=2, is_third_place=True)
+        db.session.add(third_place)
+        db.session.flush()
+        third_place_id = third_place.id
+        for slot, semifinal in enumerate(semifinals, 1):
+            semifinal.loser_next_match_id = third_place.id
+            semifinal.loser_next_match_slot = slot
+        db.session.get(Tournament, tournament_id).total_matches += 1
+        db.session.commit()
+    play_open_matches(tournament_id)
+    assert not finish(app, client, tournament_id)
+
+    with app.app_context():
+        assert rebuild_counters(tournament_id) == (2, 2)
+        db.session.commit()
+        assert db.session.get(Match, third_place_id).is_bye
+    assert finish(app, client, tournament_id)
@@ -0,0 +1,38 @@
+import contextlib
+import pytest
+from sqlalchemy.exc import OperationalError
+from app import create_app, init_database
+from models import db
+from profiling import timed
+
+
+@pytest.fixture
+def profiled_app(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s' % (tmp_path / 'profiled.db'), 'PROFILING': True})
+    init_database(app)
+    return app
+
+
+def test_profiling_is_switched_on_per_app(app, profiled_app):
+    response = profiled_app.test_client().get('/')
+    assert 'total;dur=' in response.headers['Server-Timing']
+    assert profiled_app.test_client().get('/metrics').status_code == 200
+
+    # The app without PROFILING stays uninstrumented, whatever other apps do
+    response = app.test_client().get('/')
+    assert 'Server-Timing' not in response.headers
+    assert app.test_client().get('/metrics').status_code == 404
+    with app.test_request_context('/'):
+        assert isinstance(timed('render'), contextlib.nullcontext)
+    with profiled_app.test_request_context('/'):
+        assert not isinstance(timed('render'), contextlib.nullcontext)
+
+
+def test_failed_statement_leaves_no_start_time_behind(profiled_app):
+    with profiled_app.app_context():
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql('SELECT * FROM no_such_table')
+            assert conn.info['profile_start'] == []
+            conn.exec_driver_sql('SELECT 1')
+            assert conn.info['profile_start'] == []
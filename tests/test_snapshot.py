@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import event
+from cache import page_cache
+from models import db
+
+MODES = ('round_robin', 'knockout', 'double_elimination', 'swiss', 'groups')
+
+
+def page_statements(app, client, tournament_id):
+    """SQL statements executed to render the tournament page without the page cache."""
+    page_cache.clear()
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.get('/tournament/%d' % tournament_id)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_tournament_page_query_count_does_not_grow_with_the_field(app, client, create_tournament, mode):
+    counts = [page_statements(app, client, create_tournament(mode=mode, players=players)) for players in (4, 16, 64)]
+    assert counts == [counts[0]] * len(counts)
+
+
+def test_tournament_page_query_count_is_the_same_for_every_mode(app, client, create_tournament):
+    counts = {mode: page_statements(app, client, create_tournament(mode=mode, players=12)) for mode in MODES}
+    assert set(counts.values()) == {7}, counts
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+from utils import HeadToHead, STAT_FIELDS, match_contribution, sort_standings
+
+
+def ranking(results):
+    """Standings order for (player1, player2, legs1, legs2) results, players are given by name."""
+    names = sorted({name for result in results for name in result[:2]})
+    ids = {name: number for number, name in enumerate(names, 1)}
+    matches = [SimpleNamespace(id=number, player1_id=ids[p1], player2_id=ids[p2],
+                               score_player1=s1, score_player2=s2, completed=True)
+               for number, (p1, p2, s1, s2) in enumerate(results, 1)]
+    stats = {ids[name]: dict(dict.fromkeys(STAT_FIELDS, 0), player=SimpleNamespace(id=ids[name], name=name))
+             for name in names}
+    for match in matches:
+        for player_id, values in match_contribution(match).items():
+            for field, value in values.items():
+                stats[player_id][field] += value
+    return [row['player'].name for row in sort_standings(stats, matches, HeadToHead(matches))]
+
+
+def test_cyclic_three_way_tie_falls_back_to_leg_difference_and_legs_won():
+    # A, B and C beat each other in a circle 3:1, the mini league is level.
+    # A has the best leg difference, B and C are level there and B won more legs.
+    assert ranking([
+        ('A', 'B', 3, 1), ('B', 'C', 3, 1), ('C', 'A', 3, 1),
+        ('A', 'D', 3, 0), ('B', 'D', 4, 2), ('C', 'D', 2, 0),
+    ]) == ['A', 'B', 'C', 'D']
+
+
+def test_four_way_tie_recurses_into_the_remaining_players():
+    # All four have 4 points. D lost every match against the others, A, B and C are
+    # level in the four way mini league (4 points, +2). Among themselves B has the
+    # worst difference and C beat A, although B won the most legs overall.
+    assert ranking([
+        ('A', 'B', 3, 0), ('B', 'C', 3, 2), ('C', 'A', 3, 1),
+        ('A', 'D', 3, 2), ('B', 'D', 5, 1), ('C', 'D', 3, 2),
+        ('D', 'E', 3, 0), ('D', 'F', 3, 1),
+    ]) == ['C', 'A', 'B', 'D', 'F', 'E']
+
+
+def test_five_way_tie_splits_into_head_to_head_pairs():
+    # Every player beat the next two in the circle P0 -> P4, so all have 4 points.
+    # P4/P1 and P3/P0 are level on leg difference, the direct match decides each
+    # pair even though the loser won more legs.
+    assert ranking([
+        ('P0', 'P1', 3, 2), ('P0', 'P2', 3, 2), ('P1', 'P2', 4, 3), ('P1', 'P3', 3, 1),
+        ('P2', 'P3', 3, 0), ('P2', 'P4', 3, 2), ('P3', 'P4', 3, 1), ('P3', 'P0', 3, 1),
+        ('P4', 'P0', 3, 2), ('P4', 'P1', 3, 1),
+    ]) == ['P2', 'P4', 'P1', 'P3', 'P0']
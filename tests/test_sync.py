@@ -0,0 +1,94 @@
+from models import db, Match
+
+
+def sync(client, tournament_id, entries, since=0):
+    response = client.post('/api/tournament/%d/sync' % tournament_id, json={'since': since, 'entries': entries})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def first_match(client, tournament_id):
+    changes = client.get('/api/tournament/%d/changes' % tournament_id).get_json()
+    return next(m for m in changes['matches'] if m['player1_id'] and m['player2_id'])
+
+
+def outcomes(data):
+    return [(result['key'], result['status'], result['version']) for result in data['results']]
+
+
+def test_second_entry_with_same_base_version_is_a_conflict(app, client, create_tournament):
+    tournament_id = create_tournament(players=4)
+    match = first_match(client, tournament_id)
+    data = sync(client, tournament_id, [
+        {'key': 'a', 'match_id': match['id'], 'score1': 3, 'score2': 1, 'version': match['version']},
+        {'key': 'b', 'match_id': match['id'], 'score1': 0, 'score2': 3, 'version': match['version']},
+    ])
+    assert outcomes(data) == [('a', 'applied', match['version'] + 1), ('b', 'conflict', match['version'] + 1)]
+    with app.app_context():
+        stored = db.session.get(Match, match['id'])
+        assert (stored.score_player1, stored.score_player2, stored.version) == (3, 1, match['version'] + 1)
+
+
+def test_entry_based_on_own_earlier_entry_is_applied(app, client, create_tournament):
+    tournament_id = create_tournament(players=4)
+    match = first_match(client, tournament_id)
+    data = sync(client, tournament_id, [
+        {'key': 'a', 'match_id': match['id'], 'score1': 3, 'score2': 1, 'version': match['version']},
+        {'key': 'b', 'match_id': match['id'], 'score1': 2, 'score2': 3, 'version': match['version'] + 1},
+    ])
+    assert outcomes(data) == [('a', 'applied', match['version'] + 1), ('b', 'applied', match['version'] + 2)]
+    with app.app_context():
+        assert db.session.get(Match, match['id']).version == match['version'] + 2
+    changed = {m['id']: m for m in data['matches']}
+    assert changed[match['id']]['version'] == match['version'] + 2
+
+
+def test_replayed_queue_is_not_applied_twice(app, client, create_tournament):
+    tournament_id = create_tournament(players=4)
+    match = first_match(client, tournament_id)
+    entries = [{'key': 'a', 'match_id': match['id'], 'score1': 3, 'score2': 1, 'version': match['version']}]
+    first = sync(client, tournament_id, entries)
+    replay = sync(client, tournament_id, entries)
+    assert outcomes(replay) == outcomes(first) == [('a', 'applied', match['version'] + 1)]
+    assert [result['duplicate'] for result in replay['results']] == [True]
+    assert replay['revision'] == first['revision']
+    with app.app_context():
+        assert db.session.get(Match, match['id']).version == match['version'] + 1
+
+
+def test_entry_on_a_match_changed_elsewhere_is_a_conflict(client, create_tournament):
+    tournament_id = create_tournament(players=4)
+    match = first_match(client, tournament_id)
+    client.post('/update_score/%d' % match['id'], data={'score_player1': 3, 'score_player2': 0})
+    data = sync(client, tournament_id, [
+        {'key': 'a', 'match_id': match['id'], 'score1': 0, 'score2': 3, 'version': match['version']}])
+    assert outcomes(data) == [('a', 'conflict', match['version'] + 1)]
+
+
+def test_changes_since_revision_only_lists_changed_matches(client, create_tournament):
+    tournament_id = create_tournament(players=6)
+    full = client.get('/api/tournament/%d/changes' % tournament_id).get_json()
+    assert full['full'] and len(full['matches']) == 15
+    match = first_match(client, tournament_id)
+    client.post('/update_score/%d' % match['id'], data={'score_player1': 3, 'score_player2': 0})
+    delta = client.get('/api/tournament/%d/changes?since=%d' % (tournament_id, full['revision'])).get_json()
+    assert not delta['full']
+    assert [m['id'] for m in delta['matches']] == [match['id']]
+
+
+def test_board_call_is_synced_without_a_new_version(client, create_tournament):
+    tournament_id = create_tournament(players=4, boards=1)
+    full = client.get('/api/tournament/%d/changes' % tournament_id).get_json()
+    on_board = next(m for m in full['matches'] if m['board'] == 1)
+    waiting = next(m for m in full['matches'] if m['board'] is None and m['round_number'] == on_board['round_number'])
+    data = sync(client, tournament_id, [
+        {'key': 'a', 'match_id': on_board['id'], 'score1': 3, 'score2': 1, 'version': on_board['version']}],
+        since=full['revision'])
+    # The freed board went to the waiting match, the delta delivers it with its old version
+    called = {m['id']: m for m in data['matches']}[waiting['id']]
+    assert (called['board'], called['version']) == (1, waiting['version'])
+
+    # A result entered against the version from before the board call is still valid
+    data = sync(client, tournament_id, [
+        {'key': 'b', 'match_id': waiting['id'], 'score1': 3, 'score2': 2, 'version': waiting['version']}])
+    assert outcomes(data) == [('b', 'applied', waiting['version'] + 1)]
@@ -1,224 +1,1094 @@
-from models import db, Match, Player
+from models import db, Tournament, Match, Player, Standing, PlayerProfile
+from sqlalchemy import insert, update, select, func, case, or_, and_
+from sqlalchemy.orm import aliased
+from sqlalchemy.exc import IntegrityError
+from swiss import pair_swiss_round
+from boards import plan_boards
+from cache import group_cache
+from types import SimpleNamespace
+from datetime import datetime
+import itertools
 import math
 import random
 
-def advance_winner(match):
+def bump_revision(tournament_id, match_ids=(), board_ids=()):
     """
-    Advances the winner of a match to the next match in the bracket.
-    Also advances the loser if a loser match is defined (e.g. for 3rd place).
+    Increments the revision of a tournament in the current transaction.
+    Every change that affects the tournament page has to call this, it invalidates ETags and cached pages.
+    match_ids are the matches whose players, score or completion changed with it: their version
+    goes up by one and they are stamped with the new revision, which is the sequence number of
+    the delta sync (see match_changes in routes). board_ids are matches that were only called to a board
+    or taken off one: they are stamped as well, so the delta sync delivers them, but keep their
+    version, a result entered against it is still valid.
+    """
+    Tournament.query.filter_by(id=tournament_id).update(
+        {Tournament.revision: Tournament.revision + 1}, synchronize_session=False)
+    revision = select(Tournament.revision).where(Tournament.id == tournament_id).scalar_subquery()
+    if match_ids:
+        Match.query.filter(Match.tournament_id == tournament_id, Match.id.in_(list(match_ids))).update(
+            {Match.version: Match.version + 1, Match.changed_revision: revision}, synchronize_session=False)
+    board_only = set(board_ids) - set(match_ids)
+    if board_only:
+        Match.query.filter(Match.tournament_id == tournament_id, Match.id.in_(list(board_only))).update(
+            {Match.changed_revision: revision}, synchronize_session=False)
+
+def current_revision(tournament_id):
+    """Returns the revision of a tournament without loading anything else, or None if it does not exist."""
+    return db.session.query(Tournament.revision).filter_by(id=tournament_id).scalar()
+
+def adjust_completed_matches(tournament_id, delta):
+    """Moves the completed match counter of a tournament in the current transaction."""
+    if delta:
+        Tournament.query.filter_by(id=tournament_id).update(
+            {Tournament.completed_matches: Tournament.completed_matches + delta}, synchronize_session=False)
+
+def adjust_total_matches(tournament_id, delta):
+    """Moves the total match counter of a tournament in the current transaction."""
+    if delta:
+        Tournament.query.filter_by(id=tournament_id).update(
+            {Tournament.total_matches: Tournament.total_matches + delta}, synchronize_session=False)
+
+def rebuild_counters(tournament_id):
+    """
+    Recomputes total/completed match counters of a tournament with one aggregate query
+    and stores them. Byes are not counted. Matches of tournaments created before the
+    is_bye flag existed and orphaned 3rd place matches are flagged first. Returns (total, completed). The caller commits.
+    """
+    tournament = Tournament.query.get(tournament_id)
+    legacy_byes = Match.query.filter(Match.tournament_id == tournament_id, Match.is_bye == False,
+                                     Match.player1_id != None, Match.player2_id == None)
+    if tournament.mode == 'round_robin':
+        legacy_byes.update({Match.is_bye: True}, synchronize_session=False)
+    elif tournament.mode == 'knockout':
+        legacy_byes.filter(Match.round_number == 1, Match.completed == True).update(
+            {Match.is_bye: True}, synchronize_session=False)
+    if tournament.mode in ('knockout', 'groups'):
+        # 3rd place matches fed by a bye semifinal (3 players, created before those were
+        # left out) can never get a second player, they are byes as well
+        bye_semifinals = db.session.query(Match.loser_next_match_id).filter(
+            Match.tournament_id == tournament_id, Match.is_bye == True, Match.loser_next_match_id != None)
+        Match.query.filter(Match.tournament_id == tournament_id, Match.is_third_place == True, Match.is_bye == False,
+                           Match.id.in_(bye_semifinals)).update(
+            {Match.is_bye: True, Match.completed: True}, synchronize_session=False)
+
+    total, completed = db.session.query(
+        func.count(Match.id), func.coalesce(func.sum(case((Match.completed == True, 1), else_=0)), 0)
+    ).filter(Match.tournament_id == tournament_id, Match.is_bye == False).one()
+    tournament.total_matches = total
+    tournament.completed_matches = completed
+    return total, completed
+
+STAT_FIELDS = ('points', 'wins', 'losses', 'draws', 'legs_won', 'legs_lost', 'open_matches')
+
+def match_contribution(match):
+    """
+    Returns what a single match adds to the standings as {player_id: {stat: delta}}.
+    Byes and matches that are still waiting for a player contribute nothing.
     """
+    p1 = match.player1_id
+    p2 = match.player2_id
+    if not p1 or not p2:
+        return {}
+
+    stats1 = dict.fromkeys(STAT_FIELDS, 0)
+    stats2 = dict.fromkeys(STAT_FIELDS, 0)
+
     if not match.completed:
+        stats1['open_matches'] = 1
+        stats2['open_matches'] = 1
+        return {p1: stats1, p2: stats2}
+
+    s1 = match.score_player1 or 0
+    s2 = match.score_player2 or 0
+    stats1['legs_won'], stats1['legs_lost'] = s1, s2
+    stats2['legs_won'], stats2['legs_lost'] = s2, s1
+
+    if s1 > s2:
+        # 2 points for a win
+        stats1['points'], stats1['wins'], stats2['losses'] = 2, 1, 1
+    elif s2 > s1:
+        stats2['points'], stats2['wins'], stats1['losses'] = 2, 1, 1
+    else:
+        # 1 point for a draw
+        stats1['points'], stats1['draws'] = 1, 1
+        stats2['points'], stats2['draws'] = 1, 1
+    return {p1: stats1, p2: stats2}
+
+def update_standings(match, sign=1):
+    """
+    Applies (sign=1) or removes (sign=-1) the contribution of a match to the persisted standings.
+    Call it with -1 before changing a match and with +1 afterwards.
+    """
+    update_ratings(match, sign)
+    contribution = match_contribution(match)
+    if not contribution:
         return
-        
-    winner = None
-    loser = None
+
+    rows = Standing.query.filter(Standing.tournament_id == match.tournament_id,
+                                 Standing.player_id.in_(list(contribution.keys()))).all()
+    for row in rows:
+        for stat, delta in contribution[row.player_id].items():
+            if delta:
+                setattr(row, stat, getattr(row, stat) + sign * delta)
+
+def rebuild_standings(tournament_id):
+    """
+    Recomputes the persisted standings of a tournament from all of its matches.
+    Used for the initial build after schedule generation and to repair drifted rows.
+    The caller is responsible for committing.
+    """
+    players = Player.query.filter_by(tournament_id=tournament_id).filter(
+        Player.name != "BYE_PLAYER_DUMMY").all()
+    # Plain column tuples are enough here and much cheaper than ORM objects for large fields
+    matches = db.session.query(Match.player1_id, Match.player2_id, Match.score_player1,
+                               Match.score_player2, Match.completed).filter_by(tournament_id=tournament_id).all()
+
+    Standing.query.filter_by(tournament_id=tournament_id).delete()
+    rows = {player.id: Standing(tournament_id=tournament_id, player_id=player.id, **dict.fromkeys(STAT_FIELDS, 0))
+            for player in players}
+
+    for match in matches:
+        for pid, deltas in match_contribution(match).items():
+            if pid in rows:
+                for stat, delta in deltas.items():
+                    setattr(rows[pid], stat, getattr(rows[pid], stat) + delta)
+
+    db.session.add_all(rows.values())
+    return list(rows.values())
+
+ELO_START = 1500.0
+ELO_K = 32
+PROFILE_STATS = ('matches', 'wins', 'losses', 'draws', 'legs_won', 'legs_lost')
+
+def expected_score(rating, opponent_rating):
+    """Elo expectation of the player with `rating`: 1 = certain win, 0.5 = even."""
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+def elo_change(rating1, rating2, score1, score2):
+    """Rating points player 1 gains (player 2 loses) with the given result."""
+    actual = 1.0 if score1 > score2 else 0.0 if score1 < score2 else 0.5
+    return ELO_K * (actual - expected_score(rating1, rating2))
+
+def _add_result(profile1, profile2, score1, score2, sign):
+    """Adds (sign=1) or removes (sign=-1) one result to/from the lifetime stats of both profiles."""
+    for profile, own, other in ((profile1, score1, score2), (profile2, score2, score1)):
+        profile.matches += sign
+        profile.legs_won += sign * own
+        profile.legs_lost += sign * other
+        if own > other:
+            profile.wins += sign
+        elif own < other:
+            profile.losses += sign
+        else:
+            profile.draws += sign
+
+def update_ratings(match, sign=1):
+    """
+    Applies (sign=1) or removes (sign=-1) a completed match to/from the player profiles:
+    rating and lifetime stats, updated by delta like the standings (see update_standings).
+    The applied rating change is kept on the match, so that removing the result later
+    takes back exactly what was added, even though the ratings have moved since.
+    """
+    if not match.completed or match.is_bye or not match.player1_id or not match.player2_id:
+        return
+    if sign < 0 and match.rating_change is None:
+        return # Never counted (entered before profiles existed)
+
+    profiles = dict(db.session.query(Player.id, PlayerProfile).join(
+        PlayerProfile, Player.profile_id == PlayerProfile.id).filter(
+        Player.id.in_((match.player1_id, match.player2_id))).all())
+    profile1, profile2 = profiles.get(match.player1_id), profiles.get(match.player2_id)
+    if profile1 is None or profile2 is None:
+        return
+
+    s1, s2 = match.score_player1 or 0, match.score_player2 or 0
+    if sign > 0:
+        match.rating_change = elo_change(profile1.rating, profile2.rating, s1, s2)
+        profile1.rating += match.rating_change
+        profile2.rating -= match.rating_change
+    else:
+        profile1.rating -= match.rating_change
+        profile2.rating += match.rating_change
+        match.rating_change = None
+    _add_result(profile1, profile2, s1, s2, sign)
+
+def register_profiles(names):
+    """
+    Gets or creates the profiles of the players of a new tournament and counts the
+    tournament for each of them. Returns {name: profile_id}. Does not commit.
+    """
+    now = datetime.utcnow()
+    profile_ids = dict(db.session.query(PlayerProfile.name, PlayerProfile.id).filter(PlayerProfile.name.in_(names)).all())
+    missing = [name for name in names if name not in profile_ids]
+    if missing:
+        db.session.execute(insert(PlayerProfile), [dict(name=name, search_name=name_search_key(name), rating=ELO_START)
+                                                   for name in missing])
+        profile_ids.update(db.session.query(PlayerProfile.name, PlayerProfile.id).filter(PlayerProfile.name.in_(missing)).all())
+    PlayerProfile.query.filter(PlayerProfile.id.in_(list(profile_ids.values()))).update(
+        {PlayerProfile.tournaments: PlayerProfile.tournaments + 1, PlayerProfile.last_played: now}, synchronize_session=False)
+    return profile_ids
+
+def name_search_key(name):
+    """Form of a name the prefix search compares, case-insensitive (also for umlauts and ß)."""
+    return name.strip().casefold()
+
+def suggest_players(prefix, limit=10):
+    """
+    Profiles whose name starts with prefix (case-insensitive), ranked by the number of
+    tournaments, then by the latest one. The prefix is a range scan on the indexed
+    search_name, so only matching profiles are read; an empty prefix reads the
+    popularity index. At most limit profiles are returned.
+    """
+    query = PlayerProfile.query
+    key = name_search_key(prefix)
+    if key:
+        # Every string starting with key sorts between key and key + the highest code point
+        query = query.filter(PlayerProfile.search_name >= key, PlayerProfile.search_name < key + '\U0010ffff')
+    return query.order_by(PlayerProfile.tournaments.desc(), PlayerProfile.last_played.desc(),
+                          PlayerProfile.name).limit(limit).all()
+
+def _set_last_played(condition=None):
+    statement = update(PlayerProfile).values(last_played=select(func.max(Tournament.date_created)).join(
+        Player, Player.tournament_id == Tournament.id).where(Player.profile_id == PlayerProfile.id).scalar_subquery())
+    db.session.execute(statement if condition is None else statement.where(condition))
+
+def index_profile_names(batch_size=2000):
+    """
+    Backfill for profiles from before the name search existed: fills search_name and
+    last_played where they are missing. Returns the number of updated profiles. Does not commit.
+    """
+    rows = [{'id': profile_id, 'search_name': name_search_key(name)} for profile_id, name in
+            db.session.query(PlayerProfile.id, PlayerProfile.name).filter(PlayerProfile.search_name == None)]
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(update(PlayerProfile), rows[start:start + batch_size])
+    _set_last_played(PlayerProfile.last_played == None)
+    return len(rows)
+
+def rebuild_ratings(batch_size=2000):
+    """
+    Backfill: links every player to the profile of its name (creating missing ones) and
+    replays all results in chronological order to compute ratings and lifetime stats from
+    scratch. Matches are streamed, only the profiles are kept in memory, and all writes
+    are bulk statements. Returns the number of counted matches. Does not commit.
+    """
+    names = db.session.execute(select(Player.name).where(Player.name != "BYE_PLAYER_DUMMY").distinct()).scalars().all()
+    existing = set(db.session.execute(select(PlayerProfile.name)).scalars())
+    missing = [name for name in names if name not in existing]
+    for start in range(0, len(missing), batch_size):
+        db.session.execute(insert(PlayerProfile), [dict(name=name, search_name=name_search_key(name), rating=ELO_START)
+                                                   for name in missing[start:start + batch_size]])
+    db.session.execute(update(Player).where(Player.name != "BYE_PLAYER_DUMMY").values(
+        profile_id=select(PlayerProfile.id).where(PlayerProfile.name == Player.name).scalar_subquery()))
+    _set_last_played()
+    db.session.execute(update(Match).values(rating_change=None))
+
+    # Plain objects with the profile's attributes, so _add_result works on them as well
+    profiles = {}
+    for profile_id, tournaments in db.session.query(PlayerProfile.id, func.count(Player.id)).outerjoin(
+            Player, Player.profile_id == PlayerProfile.id).group_by(PlayerProfile.id):
+        profiles[profile_id] = SimpleNamespace(id=profile_id, rating=ELO_START, tournaments=tournaments,
+                                               **dict.fromkeys(PROFILE_STATS, 0))
+
+    player1, player2 = aliased(Player), aliased(Player)
+    results = db.session.execute(
+        select(Match.id, player1.profile_id, player2.profile_id, Match.score_player1, Match.score_player2)
+        .join(Tournament, Match.tournament_id == Tournament.id)
+        .join(player1, Match.player1_id == player1.id)
+        .join(player2, Match.player2_id == player2.id)
+        .where(Match.completed == True, Match.is_bye == False,
+               player1.profile_id != None, player2.profile_id != None)
+        .order_by(Tournament.date_created, Tournament.id, Match.round_number, Match.id)
+        .execution_options(yield_per=batch_size))
+
+    changes = []
+    counted = 0
+    for match_id, profile1_id, profile2_id, s1, s2 in results:
+        profile1, profile2 = profiles[profile1_id], profiles[profile2_id]
+        s1, s2 = s1 or 0, s2 or 0
+        change = elo_change(profile1.rating, profile2.rating, s1, s2)
+        profile1.rating += change
+        profile2.rating -= change
+        _add_result(profile1, profile2, s1, s2, 1)
+        changes.append({'id': match_id, 'rating_change': change})
+        counted += 1
+        if len(changes) >= batch_size:
+            db.session.execute(update(Match), changes)
+            changes = []
+    if changes:
+        db.session.execute(update(Match), changes)
+
+    rows = [vars(totals) for totals in profiles.values()]
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(update(PlayerProfile), rows[start:start + batch_size])
+    return counted
+
+BRACKET_MODES = ('knockout', 'double_elimination')
+
+def apply_score(match, score_player1, score_player2, mode, matches_by_id=None):
+    """
+    Enters the result of a match, keeps the persisted standings in sync and
+    advances the winner (and loser) in the bracket modes. Does not commit.
+    matches_by_id can hold all matches of the tournament, otherwise they are loaded
+    with one query when the bracket has to be walked.
+    Returns the IDs of all changed matches, the scored one first.
+    """
+    if not match.completed and not match.is_bye:
+        adjust_completed_matches(match.tournament_id, 1)
+    update_standings(match, -1)
+    match.score_player1 = score_player1
+    match.score_player2 = score_player2
+    match.completed = True
+    match.board = None
+    update_standings(match, 1)
+
+    if is_bracket_match(match, mode):
+        if matches_by_id is None and mode == 'double_elimination':
+            # Byes in the losers bracket can pass a player on over several hops
+            matches_by_id = {m.id: m for m in Match.query.filter_by(tournament_id=match.tournament_id).all()}
+        return [match.id] + advance_winner(match, matches_by_id)
+    return [match.id]
+
+def advance_winner(match, matches_by_id=None):
+    """
+    Advances the winner of a match to the next match in the bracket.
+    Also advances the loser if a loser match is defined (3rd place, losers bracket).
+    A player moved into a pass-through bye of the losers bracket moves on right away.
+    Matches are looked up in matches_by_id if given, otherwise in the session.
+    Returns the IDs of the matches that got a player.
+    """
+    if not match.completed:
+        return []
+    lookup = matches_by_id.get if matches_by_id is not None else Match.query.get
+
+    # Work on the foreign keys: they are always current, even if a slot was filled
+    # earlier in the same transaction and the relationship is not refreshed yet.
+    winner_id = None
+    loser_id = None
     
-    if match.player2 is None:
-        # Bye
-        winner = match.player1
+    if match.player1_id is None or match.player2_id is None:
+        # Bye, the player may sit in either slot
+        winner_id = match.player1_id or match.player2_id
         # No loser in a bye
     elif match.score_player1 > match.score_player2:
-        winner = match.player1
-        loser = match.player2
+        winner_id = match.player1_id
+        loser_id = match.player2_id
     elif match.score_player2 > match.score_player1:
-        winner = match.player2
-        loser = match.player1
+        winner_id = match.player2_id
+        loser_id = match.player1_id
     else:
         # Draw? No draws in KO.
-        return
+        return []
 
-    # Advance Winner
-    if match.next_match_id and winner:
-        next_match = Match.query.get(match.next_match_id)
-        if next_match:
-            if match.next_match_slot == 1:
-                next_match.player1 = winner
-            elif match.next_match_slot == 2:
-                next_match.player2 = winner
-            db.session.add(next_match)
-
-    # Advance Loser (if applicable)
-    if match.loser_next_match_id and loser:
-        loser_next_match = Match.query.get(match.loser_next_match_id)
-        if loser_next_match:
-            if match.loser_next_match_slot == 1:
-                loser_next_match.player1 = loser
-            elif match.loser_next_match_slot == 2:
-                loser_next_match.player2 = loser
-            db.session.add(loser_next_match)
+    if match.bracket == 'G':
+        # Grand final: the winners bracket champion (slot 1) is done after one win,
+        # otherwise both meet again in the reset match, if there is one
+        if winner_id == match.player1_id:
+            return []
+        reset = lookup(match.next_match_id) if match.next_match_id else None
+        if reset is not None and reset.is_bye:
+            reset.is_bye = False
+            adjust_total_matches(match.tournament_id, 1)
 
-def generate_knockout_schedule(tournament_id, players):
-    n_players = len(players)
-    if n_players < 2:
-        return
+    changed = []
+    edges = ((match.next_match_id, match.next_match_slot, winner_id),
+             (match.loser_next_match_id, match.loser_next_match_slot, loser_id))
+    for target_id, slot, player_id in edges:
+        if not target_id or not player_id or slot not in (1, 2):
+            continue
+        target = lookup(target_id)
+        if target is None:
+            continue
+        update_standings(target, -1)
+        setattr(target, 'player%d_id' % slot, player_id)
+        update_standings(target, 1)
+        db.session.add(target)
+        changed.append(target.id)
+        if target.is_bye and not target.completed:
+            # Nobody else can reach this match, the player passes through
+            target.completed = True
+            changed.extend(advance_winner(target, matches_by_id))
+    return changed
+
+def reopen_with_cascade(match, mode):
+    """
+    Reopens a match. In the bracket modes everything that depended on its result is reset
+    as well: the players it advanced are removed via the next_match and loser_next_match
+    edges, affected matches are reset to 0:0 and the same is repeated for whatever those
+    had advanced. The bracket is walked over an in-memory index built with one query.
+    Returns the IDs of all changed matches, the reopened one first. Does not commit.
+    """
+    if not is_bracket_match(match, mode):
+        if match.completed and not match.is_bye:
+            adjust_completed_matches(match.tournament_id, -1)
+        update_standings(match, -1)
+        match.completed = False
+        update_standings(match, 1)
+        return [match.id]
+
+    matches_by_id = {m.id: m for m in Match.query.filter_by(tournament_id=match.tournament_id).all()}
+    match = matches_by_id[match.id]
+
+    changed = [match.id]
+    pending = [match] if match.completed else []
+    reopened = 1 if match.completed and not match.is_bye else 0
+    update_standings(match, -1)
+    match.completed = False
+    update_standings(match, 1)
 
+    while pending:
+        source = pending.pop()
+        edges = ((source.next_match_id, source.next_match_slot),
+                 (source.loser_next_match_id, source.loser_next_match_slot))
+        for target_id, slot in edges:
+            target = matches_by_id.get(target_id)
+            if target is None or slot not in (1, 2):
+                continue
+            slot_field = 'player%d_id' % slot
+            if getattr(target, slot_field) is None and not target.completed:
+                continue
+
+            # Only completed matches advanced anybody, so only those cascade further
+            if target.completed:
+                pending.append(target)
+                if not target.is_bye:
+                    reopened += 1
+            update_standings(target, -1)
+            setattr(target, slot_field, None)
+            target.board = None
+            target.completed = False
+            target.score_player1 = 0
+            target.score_player2 = 0
+            update_standings(target, 1)
+            if target.id not in changed:
+                changed.append(target.id)
+
+            if target.bracket == 'R' and not target.is_bye and not target.player1_id and not target.player2_id:
+                # The grand final is open again, the reset match is not needed for now
+                target.is_bye = True
+                adjust_total_matches(match.tournament_id, -1)
+
+    adjust_completed_matches(match.tournament_id, -reopened)
+    return changed
+
+def build_knockout_bracket(tournament_id, players, first_id, third_place=True, first_round=1):
+    """
+    Computes a complete knockout bracket in memory: all rounds, the links between them,
+    the 3rd place match (unless third_place=False or a semifinal is a bye), the seeding of round 1 (players in
+    the given order, two per match; a list with None entries places a bye in every None slot,
+    otherwise the byes go to the last players) and the propagation of bye winners into round 2.
+    Returns the match rows as dicts with pre-assigned IDs starting at first_id, the first
+    round being numbered first_round.
+    """
+    n_players = len(players)
     bracket_size = 2 ** math.ceil(math.log2(n_players))
     total_rounds = int(math.log2(bracket_size))
-    
-    rounds = []
-    
+
+    next_id = first_id
+    def new_row(round_number, is_third_place=False):
+        nonlocal next_id
+        row = {'id': next_id, 'tournament_id': tournament_id, 'round_number': round_number + first_round - 1,
+               'player1_id': None, 'player2_id': None, 'score_player1': 0, 'score_player2': 0,
+               'completed': False, 'is_third_place': is_third_place, 'is_bye': False,
+               'next_match_id': None, 'next_match_slot': None,
+               'loser_next_match_id': None, 'loser_next_match_slot': None, 'bracket': None}
+        next_id += 1
+        return row
+
     # Create matches for each round (empty placeholders initially)
-    for r in range(1, total_rounds + 1):
-        num_matches = bracket_size // (2 ** r)
-        matches_in_r = []
-        for _ in range(num_matches):
-            # player1_id=None allowed now
-            m = Match(tournament_id=tournament_id, round_number=r)
-            db.session.add(m)
-            matches_in_r.append(m)
-        rounds.append(matches_in_r)
-        
-    db.session.flush() # Generate IDs
-    
+    rounds = [[new_row(r) for _ in range(bracket_size // (2 ** r))] for r in range(1, total_rounds + 1)]
+
     # Link matches: Round r matches feed into Round r+1
-    # rounds index 0 is Round 1, index 1 is Round 2, etc.
-    for r_idx in range(total_rounds - 1): # 0 to N-2
-        current_round = rounds[r_idx]
-        next_round = rounds[r_idx+1]
-        
-        for i, match in enumerate(current_round):
-            next_match_idx = i // 2
-            next_m = next_round[next_match_idx]
-            match.next_match_id = next_m.id
-            match.next_match_slot = 1 if (i % 2 == 0) else 2
-            
-    # Add 3rd Place Match
+    for r_idx in range(total_rounds - 1):
+        next_round = rounds[r_idx + 1]
+        for i, row in enumerate(rounds[r_idx]):
+            row['next_match_id'] = next_round[i // 2]['id']
+            row['next_match_slot'] = 1 if (i % 2 == 0) else 2
+
+    # Assign players to Round 1, two slots per match, a None slot is a bye. Without
+    # explicit byes the first (N - Byes) matches are P vs P, the last Byes matches are P vs Bye
+    rows_by_id = {row['id']: row for round_rows in rounds for row in round_rows}
+    if None in players:
+        slots = list(players)
+    else:
+        n_full_matches = len(rounds[0]) - (bracket_size - n_players)
+        slots = list(players[:2 * n_full_matches]) + [slot for player in players[2 * n_full_matches:]
+                                                      for slot in (player, None)]
+    for i, row in enumerate(rounds[0]):
+        entrants = [player for player in slots[2 * i:2 * i + 2] if player is not None]
+        row['player1_id'] = entrants[0].id
+        if len(entrants) == 2:
+            row['player2_id'] = entrants[1].id
+        else:
+            # Bye: auto-complete and move the player straight into round 2
+            row['completed'] = True
+            row['is_bye'] = True
+            if row['next_match_id']:
+                next_row = rows_by_id[row['next_match_id']]
+                next_row['player%d_id' % row['next_match_slot']] = row['player1_id']
+
+    # Add 3rd Place Match, fed by the losers of the semifinals (Round N-1). With a bye in a
+    # semifinal (3 players) it could only ever get one player, so there is none.
+    third_place_rows = []
+    semifinals = rounds[total_rounds - 2] if total_rounds >= 2 else []
+    if third_place and semifinals and not any(row['is_bye'] for row in semifinals):
+        third_place_row = new_row(total_rounds, is_third_place=True)
+        for i, semi_row in enumerate(semifinals):
+            semi_row['loser_next_match_id'] = third_place_row['id']
+            semi_row['loser_next_match_slot'] = i + 1 # 1 or 2
+        third_place_rows.append(third_place_row)
+
+    return [row for round_rows in rounds for row in round_rows] + third_place_rows
+
+def build_double_elimination_bracket(tournament_id, players, first_id, bracket_reset=True):
+    """
+    Computes a double elimination bracket in memory, IDs start at first_id:
+    the winners bracket ('W', as in knockout, without 3rd place match), the losers bracket
+    ('L'), the grand final ('G') and the optional reset match ('R').
+    Losers of winners round 1 meet in losers round 1, losers of winners round r > 1 drop
+    into losers round 2(r-1). Round numbers follow the order of play: winners round r is
+    round r, losers round l is round l + 1, so sorting by round never puts a match before
+    one it depends on.
+    Losers bracket matches that can only ever get one player (because of byes in winners
+    round 1) are pass-through byes, matches that get none are stored as completed byes.
+    The reset match starts as a bye and only becomes a real match if the losers bracket
+    champion wins the grand final.
+    """
+    winners = build_knockout_bracket(tournament_id, players, first_id, third_place=False)
+    for row in winners:
+        row['bracket'] = 'W'
+    total_rounds = max(row['round_number'] for row in winners)
+    winners_rounds = [[row for row in winners if row['round_number'] == r] for r in range(1, total_rounds + 1)]
+
+    next_id = first_id + len(winners)
+    def new_row(round_number, bracket):
+        nonlocal next_id
+        row = {'id': next_id, 'tournament_id': tournament_id, 'round_number': round_number,
+               'player1_id': None, 'player2_id': None, 'score_player1': 0, 'score_player2': 0,
+               'completed': False, 'is_third_place': False, 'is_bye': False,
+               'next_match_id': None, 'next_match_slot': None,
+               'loser_next_match_id': None, 'loser_next_match_slot': None, 'bracket': bracket}
+        next_id += 1
+        return row
+
+    def link(source, target, slot, loser=False):
+        prefix = 'loser_next_match' if loser else 'next_match'
+        source[prefix + '_id'] = target['id']
+        source[prefix + '_slot'] = slot
+
+    losers_rounds = []
+    # Number of slots a player can actually arrive at, per losers bracket match
+    live_slots = {}
     if total_rounds >= 2:
-        # Semifinals are at index total_rounds - 2 (Round N-1)
-        # The list 'rounds' is 0-indexed.
-        # Round 1 is rounds[0].
-        # Final is Round N = rounds[total_rounds - 1].
-        # Semis is Round N-1 = rounds[total_rounds - 2].
-        
-        semis = rounds[total_rounds - 2]
-        
-        # Create 3rd place match in the same round number as the final (visually in same col usually)
-        third_place_match = Match(tournament_id=tournament_id, round_number=total_rounds, is_third_place=True)
-        db.session.add(third_place_match)
-        db.session.flush()
-        
-        # Link Semis to 3rd Place Match
-        for i, semi_match in enumerate(semis):
-            semi_match.loser_next_match_id = third_place_match.id
-            semi_match.loser_next_match_slot = i + 1 # 1 or 2
-            
-    # Assign players to Round 1
-    # Distribute Byes:
-    # First (N - Byes) matches are P vs P
-    # Last Byes matches are P vs Bye
-    
+        first = [new_row(2, 'L') for _ in range(len(winners_rounds[0]) // 2)]
+        for i, row in enumerate(winners_rounds[0]):
+            link(row, first[i // 2], i % 2 + 1, loser=True)
+            if not row['is_bye']:
+                live_slots[first[i // 2]['id']] = live_slots.get(first[i // 2]['id'], 0) + 1
+        losers_rounds.append(first)
+
+        for r_idx in range(1, total_rounds):
+            previous = losers_rounds[-1]
+            # Every other round the dropping losers are mirrored, so they do not meet
+            # the players they just beat straight away
+            dropping = winners_rounds[r_idx] if r_idx % 2 else winners_rounds[r_idx][::-1]
+            minor = [new_row(len(losers_rounds) + 2, 'L') for _ in previous]
+            for i, row in enumerate(previous):
+                link(row, minor[i], 1)
+                live_slots[minor[i]['id']] = 1 if live_slots.get(row['id']) else 0
+            for i, row in enumerate(dropping):
+                link(row, minor[i], 2, loser=True)
+                live_slots[minor[i]['id']] += 1
+            losers_rounds.append(minor)
+
+            if len(minor) > 1:
+                major = [new_row(len(losers_rounds) + 2, 'L') for _ in range(len(minor) // 2)]
+                for i, row in enumerate(minor):
+                    link(row, major[i // 2], i % 2 + 1)
+                    live_slots[major[i // 2]['id']] = 2
+                losers_rounds.append(major)
+
+    for round_rows in losers_rounds:
+        for row in round_rows:
+            if live_slots.get(row['id'], 0) < 2:
+                row['is_bye'] = True
+                # Nobody will ever arrive, count it as decided
+                row['completed'] = not live_slots.get(row['id'])
+
+    final_round = max(total_rounds, len(losers_rounds) + 1) + 1
+    grand_final = new_row(final_round, 'G')
+    link(winners_rounds[-1][0], grand_final, 1)
+    if losers_rounds:
+        link(losers_rounds[-1][0], grand_final, 2)
+    else:
+        # Two players: the loser of the only winners match goes straight to the grand final
+        link(winners_rounds[-1][0], grand_final, 2, loser=True)
+    finals = [grand_final]
+
+    if bracket_reset:
+        reset = new_row(final_round + 1, 'R')
+        reset['is_bye'] = True
+        # Only used if the losers bracket champion (slot 2) wins the grand final
+        link(grand_final, reset, 2)
+        link(grand_final, reset, 1, loser=True)
+        finals.append(reset)
+
+    return winners + [row for round_rows in losers_rounds for row in round_rows] + finals
+
+def _insert_bracket(build):
+    """
+    Stores a bracket built by build(first_id) in a single bulk insert. Does not commit.
+    IDs are assigned up front so that the next/loser links can be written in the same insert.
+    """
+    for attempt in range(3):
+        first_id = (db.session.query(func.max(Match.id)).scalar() or 0) + 1
+        rows = build(first_id)
+        try:
+            # In a savepoint, a failed attempt must not roll back the caller's transaction
+            with db.session.begin_nested():
+                # Referenced matches (later rounds) first, in case foreign keys are enforced
+                db.session.execute(insert(Match), rows[::-1])
+            return
+        except IntegrityError:
+            # Another request took the same IDs in the meantime
+            if attempt == 2:
+                raise
+
+def generate_knockout_schedule(tournament_id, players):
+    """
+    Creates a knockout bracket with random seeding in a single bulk insert.
+    The players must already have IDs. Does not commit.
+    """
+    if len(players) < 2:
+        return
+
     random.shuffle(players)
-    player_idx = 0
-    round1_matches = rounds[0]
-    n_byes = bracket_size - n_players
-    
-    n_full_matches = len(round1_matches) - n_byes
-    
-    # Assign players
-    for i, match in enumerate(round1_matches):
-        if i < n_full_matches:
-            # Full match (P vs P)
-            match.player1 = players[player_idx]
-            match.player2 = players[player_idx + 1]
-            player_idx += 2
+    _insert_bracket(lambda first_id: build_knockout_bracket(tournament_id, players, first_id))
+
+def generate_double_elimination_schedule(tournament_id, players, bracket_reset=True):
+    """
+    Creates a double elimination bracket with random seeding in a single bulk insert.
+    The players must already have IDs. Does not commit.
+    """
+    if len(players) < 2:
+        return
+
+    random.shuffle(players)
+    _insert_bracket(lambda first_id: build_double_elimination_bracket(tournament_id, players, first_id, bracket_reset))
+
+def _circle_position(slot, round_idx, n):
+    """Index of the player sitting at a slot of the circle in a round (0-based)."""
+    if slot == 0:
+        return 0
+    return (slot - 1 - round_idx) % (n - 1) + 1
+
+def round_robin_pairings(num_players):
+    """
+    Circle method in closed form: yields (round_number, index1, index2) for every pairing.
+    Player 0 stays fixed while the others rotate one position per round, exactly as the
+    old list rotation did. For an odd field the index num_players stands for the bye.
+    """
+    n = num_players + (num_players % 2)
+    for round_idx in range(n - 1):
+        for slot in range(n // 2):
+            yield (round_idx + 1,
+                   _circle_position(slot, round_idx, n),
+                   _circle_position(n - 1 - slot, round_idx, n))
+
+def round_robin_rows(tournament_id, players, group_number=None):
+    """Match rows of a complete round robin between the given players, ready for a bulk insert."""
+    num_players = len(players)
+    rows = []
+    for round_number, i1, i2 in round_robin_pairings(num_players):
+        if i1 >= num_players:
+            # players[i2] has a bye
+            p1_id, p2_id = players[i2].id, None
+        elif i2 >= num_players:
+            # players[i1] has a bye
+            p1_id, p2_id = players[i1].id, None
         else:
-            # Bye match (P vs Bye)
-            match.player1 = players[player_idx]
-            match.player2 = None
-            player_idx += 1
-            
-            # Auto-complete
-            match.completed = True
-            
-    db.session.commit()
-    
-    # Advance winners for completed matches (Byes)
-    # Need to query from DB to ensure relationships are loaded if needed
-    r1 = Match.query.filter_by(tournament_id=tournament_id, round_number=1).all()
-    for m in r1:
-        if m.completed:
-            advance_winner(m)
-            
-    db.session.commit()
+            p1_id, p2_id = players[i1].id, players[i2].id
+        rows.append({'tournament_id': tournament_id, 'round_number': round_number, 'group_number': group_number,
+                     'player1_id': p1_id, 'player2_id': p2_id, 'is_bye': p2_id is None})
+    return rows
 
 def generate_round_robin_schedule(tournament_id, players):
-    num_players = len(players)
-    
-    # If odd number of players, add a dummy player for "bye" rounds
-    if num_players % 2 != 0:
-        dummy_player = Player(name="BYE_PLAYER_DUMMY", tournament_id=tournament_id)
-        db.session.add(dummy_player)
-        db.session.commit()
-        players.append(dummy_player)
-        num_players += 1
-
-    schedule = []
-    player_indices = list(range(num_players))
-
-    for round_idx in range(num_players - 1):
-        round_matches = []
-        current_round_num = round_idx + 1
-        for i in range(num_players // 2):
-            p1_idx = player_indices[i]
-            p2_idx = player_indices[num_players - 1 - i]
-            
-            p1 = players[p1_idx]
-            p2 = players[p2_idx]
-
-            # Only create matches if neither player is the dummy player
-            if p1.name != "BYE_PLAYER_DUMMY" and p2.name != "BYE_PLAYER_DUMMY":
-                round_matches.append(Match(player1=p1, player2=p2, round_number=current_round_num, tournament_id=tournament_id))
-            elif p1.name == "BYE_PLAYER_DUMMY":
-                # p2 has a bye
-                round_matches.append(Match(player1=p2, player2_id=None, round_number=current_round_num, tournament_id=tournament_id))
-            elif p2.name == "BYE_PLAYER_DUMMY":
-                # p1 has a bye
-                round_matches.append(Match(player1=p1, player2_id=None, round_number=current_round_num, tournament_id=tournament_id))
-        schedule.extend(round_matches)
-
-        # Rotate players, keeping the first player fixed
-        first_player = player_indices[0]
-        rotated_players = player_indices[1:]
-        rotated_players = rotated_players[-1:] + rotated_players[:-1]
-        player_indices = [first_player] + rotated_players
-    
-    for match in schedule:
-        db.session.add(match)
-    db.session.commit()
+    """
+    Creates all matches of a round robin with a single bulk insert.
+    The players must already have IDs. A bye is stored as a match without player2,
+    no dummy player is persisted for odd fields. Does not commit.
+    """
+    rows = round_robin_rows(tournament_id, players)
+    if rows:
+        db.session.execute(insert(Match), rows)
 
-def calculate_mini_league(matches, tied_players_ids):
+def current_round(tournament_id):
+    """Highest round number of a tournament, 0 if it has no matches yet."""
+    return db.session.query(func.max(Match.round_number)).filter_by(tournament_id=tournament_id).scalar() or 0
+
+def generate_swiss_round(tournament_id, players=None):
     """
-    Calculates stats considering ONLY matches between the players in tied_players_ids.
-    Returns a dict: {player_id: {'mini_points': x, 'mini_diff': y, 'mini_legs_won': z}}
+    Pairs and stores the next round of a Swiss tournament with a single bulk insert.
+    Round 1 is drawn at random (pass the players on creation), later rounds pair players
+    with equal points in the order of sort_standings without rematches (see swiss.py).
+    The new matches are added to the standings and the match counter. Does not commit.
+    Returns the number of the new round.
     """
-    mini_stats = {pid: {'mini_points': 0, 'mini_diff': 0, 'mini_legs_won': 0} for pid in tied_players_ids}
-    
+    round_number = current_round(tournament_id) + 1
+    # Plain column tuples, enough for the pairing and the head-to-head index
+    matches = db.session.query(Match.player1_id, Match.player2_id, Match.score_player1,
+                               Match.score_player2, Match.completed, Match.is_bye).filter_by(tournament_id=tournament_id).all()
+
+    if round_number == 1:
+        players = list(players if players is not None else Player.query.filter_by(tournament_id=tournament_id))
+        random.shuffle(players)
+        ranked_ids = [player.id for player in players]
+        points = {}
+    else:
+        players = {p.id: p for p in Player.query.filter_by(tournament_id=tournament_id)}
+        player_stats = {s.player_id: s.to_stats(players.get(s.player_id))
+                        for s in Standing.query.filter_by(tournament_id=tournament_id) if s.player_id in players}
+        ranked_ids = [row['player'].id for row in sort_standings(player_stats, matches)]
+        points = {player_id: stats['points'] for player_id, stats in player_stats.items()}
+
+    played = {frozenset((m.player1_id, m.player2_id)) for m in matches if m.player1_id and m.player2_id}
+    byes = {m.player1_id for m in matches if m.is_bye}
+    pairs, bye_id = pair_swiss_round(ranked_ids, points, played, byes)
+
+    rows = [{'tournament_id': tournament_id, 'round_number': round_number,
+             'player1_id': p1_id, 'player2_id': p2_id, 'is_bye': False} for p1_id, p2_id in pairs]
+    if bye_id is not None:
+        rows.append({'tournament_id': tournament_id, 'round_number': round_number,
+                     'player1_id': bye_id, 'player2_id': None, 'is_bye': True, 'completed': True})
+    if rows:
+        db.session.execute(insert(Match), rows)
+
+    # Every new pairing is one more open match for both of its players
+    paired_ids = [player_id for pair in pairs for player_id in pair]
+    if paired_ids:
+        Standing.query.filter(Standing.tournament_id == tournament_id, Standing.player_id.in_(paired_ids)).update(
+            {Standing.open_matches: Standing.open_matches + 1}, synchronize_session=False)
+    Tournament.query.filter_by(id=tournament_id).update(
+        {Tournament.total_matches: Tournament.total_matches + len(pairs)}, synchronize_session=False)
+    return round_number
+
+def default_group_count(n_players):
+    """Groups of four or five players."""
+    return max(1, n_players // 4)
+
+def assign_groups(players, group_count):
+    """
+    Spreads the players over the groups in snake order (1..N, N..1, ...), so with the
+    players listed by strength every group gets one player of each seeding pot.
+    Sets player.group_number and returns {group_number: [players]}.
+    """
+    groups = {number: [] for number in range(1, group_count + 1)}
+    for index, player in enumerate(players):
+        pot, position = divmod(index, group_count)
+        number = position + 1 if pot % 2 == 0 else group_count - position
+        player.group_number = number
+        groups[number].append(player)
+    return groups
+
+def generate_group_stage(tournament_id, players, group_count):
+    """
+    Splits the players into seeded groups and creates a round robin for every group,
+    all in a single bulk insert. The players must already have IDs. Does not commit.
+    """
+    rows = []
+    for number, group_players in assign_groups(players, group_count).items():
+        rows.extend(round_robin_rows(tournament_id, group_players, group_number=number))
+    if rows:
+        db.session.execute(insert(Match), rows)
+
+def compute_group_table(players, group_matches):
+    """
+    Ranks one group from its own matches only, with the tie-breakers of sort_standings.
+    players: objects with an id. Returns the ranked list of stats dicts.
+    """
+    stats = {player.id: dict(dict.fromkeys(STAT_FIELDS, 0), player=player) for player in players}
+    for match in group_matches:
+        for pid, deltas in match_contribution(match).items():
+            if pid in stats:
+                for stat, delta in deltas.items():
+                    stats[pid][stat] += delta
+    return sort_standings(stats, group_matches)
+
+def group_tables(tournament_id, players, matches):
+    """
+    Ranked table of every group as {group_number: [stats]}, for players with a group_number.
+    Each group only depends on its own few matches, so a table is computed only if one of
+    its results changed and is otherwise taken from the cache. The work per score change
+    therefore depends on the group size, not on the size of the field.
+    """
+    players_by_group = {}
+    for player in players:
+        if player.group_number is not None:
+            players_by_group.setdefault(player.group_number, []).append(player)
+    matches_by_group = {}
     for match in matches:
-        if match.completed and match.player1_id in tied_players_ids and match.player2_id in tied_players_ids:
-            p1 = match.player1_id
-            p2 = match.player2_id
-            
-            s1 = match.score_player1
-            s2 = match.score_player2
-            
-            # Update Mini Legs
-            mini_stats[p1]['mini_legs_won'] += s1
-            mini_stats[p1]['mini_diff'] += (s1 - s2)
-            
-            mini_stats[p2]['mini_legs_won'] += s2
-            mini_stats[p2]['mini_diff'] += (s2 - s1)
-            
-            # Update Mini Points
+        if match.group_number is not None:
+            matches_by_group.setdefault(match.group_number, []).append(match)
+
+    tables = {}
+    for number in sorted(players_by_group):
+        group_matches = matches_by_group.get(number, [])
+        key = (tournament_id, number, tuple(players_by_group[number]),
+               tuple((m.id, m.player1_id, m.player2_id, m.score_player1, m.score_player2, bool(m.completed))
+                     for m in group_matches))
+        table = group_cache.get(key)
+        if table is None:
+            table = compute_group_table(players_by_group[number], group_matches)
+            group_cache.set(key, table)
+        tables[number] = table
+    return tables
+
+def _stats_key(row):
+    return (row['points'], row['legs_won'] - row['legs_lost'], row['legs_won'])
+
+def seed_group_qualifiers(tables, advance):
+    """
+    Orders the qualifiers of the group stage for build_knockout_bracket.
+    Seeds are all group winners, then all runners-up and so on, each pot ordered by
+    points and legs. The best seeds get the byes, the others meet best against worst,
+    and players from the same group are kept apart in the first round where possible.
+    Returns the round 1 slots for build_knockout_bracket, None for a bye.
+    """
+    seeds = []
+    for position in range(advance):
+        pot = [table[position] for table in tables.values() if len(table) > position]
+        seeds.extend(sorted(pot, key=_stats_key, reverse=True))
+    if len(seeds) < 2:
+        return [row['player'] for row in seeds]
+
+    # Standard bracket order: seed 1 meets the last seed, seeds 1 and 2 can only meet in
+    # the final. Seeds beyond the field are byes, so the best seeds get them.
+    bracket_size = 2 ** math.ceil(math.log2(len(seeds)))
+    order = [1]
+    while len(order) < bracket_size:
+        order = [seed for top in order for seed in (top, 2 * len(order) + 1 - top)]
+    pairs = [[seeds[seed - 1] if seed <= len(seeds) else None for seed in order[i:i + 2]]
+             for i in range(0, bracket_size, 2)]
+
+    group_of = lambda row: row['player'].group_number
+    playing = [pair for pair in pairs if None not in pair]
+    for pair in playing:
+        if group_of(pair[0]) != group_of(pair[1]):
+            continue
+        for other in playing:
+            if other is not pair and group_of(other[1]) != group_of(pair[0]) and group_of(pair[1]) != group_of(other[0]):
+                pair[1], other[1] = other[1], pair[1]
+                break
+
+    return [row['player'] if row is not None else None for pair in pairs for row in pair]
+
+def is_bracket_match(match, mode):
+    """True if results of this match advance players through next/loser links."""
+    return mode in BRACKET_MODES or (mode == 'groups' and match.group_number is None)
+
+def assign_boards(tournament_id):
+    """
+    Calls open matches to the free boards of a tournament (see plan_boards). Matches already
+    on a board stay there, so after a result only the board that became free is refilled:
+    only the matches on a board and just enough queued candidates are loaded, never the
+    whole schedule. Does nothing for tournaments without boards. Does not commit.
+    Returns the IDs of the matches whose board changed.
+    """
+    boards = db.session.query(Tournament.boards).filter_by(id=tournament_id).scalar() or 0
+    # At most one match per board, read with the (tournament_id, board) index
+    called = Match.query.filter(Match.tournament_id == tournament_id, Match.board != None).all()
+    if not boards and not called:
+        return []
+
+    changed = []
+    busy = set()
+    taken = set()
+    for match in called:
+        if match.completed or match.is_bye or match.board > boards or not match.player1_id or not match.player2_id:
+            # Board removed or match no longer playable
+            match.board = None
+            changed.append(match.id)
+        else:
+            taken.add(match.board)
+            busy.update((match.player1_id, match.player2_id))
+
+    free_boards = [board for board in range(1, boards + 1) if board not in taken]
+    if not free_boards:
+        return changed
+
+    # Candidates in queue order, a few per free board; more are read only if players on
+    # a board block too many of them
+    query = Match.query.filter(Match.tournament_id == tournament_id, Match.completed == False, Match.is_bye == False,
+                               Match.board == None, Match.player1_id != None, Match.player2_id != None)
+    waiting = []
+    batch = 4 * len(free_boards)
+    plan = []
+    while True:
+        candidates = query
+        if waiting:
+            last = waiting[-1]
+            candidates = candidates.filter(or_(Match.round_number > last.round_number,
+                                               and_(Match.round_number == last.round_number, Match.id > last.id)))
+        rows = candidates.order_by(Match.round_number, Match.id).limit(batch).all()
+        waiting.extend(rows)
+        plan = plan_boards(free_boards, [(m.id, m.player1_id, m.player2_id) for m in waiting], busy)
+        if len(plan) == len(free_boards) or len(rows) < batch:
+            break
+        batch *= 2
+
+    by_id = {match.id: match for match in waiting}
+    for board, match_id in plan:
+        by_id[match_id].board = board
+        changed.append(match_id)
+    return changed
+
+def board_queue(matches):
+    """
+    Board view of a tournament from its MatchViews: ({board: match} for the called matches,
+    [(match, ready)] for the playable matches still waiting, in queue order). A waiting
+    match is ready if none of its players is on a board right now.
+    """
+    on_board = {}
+    waiting = []
+    for match in matches:
+        if match.completed or match.is_bye or not match.player1_id or not match.player2_id:
+            continue
+        if match.board is not None:
+            on_board[match.board] = match
+        else:
+            waiting.append(match)
+    busy = {pid for match in on_board.values() for pid in (match.player1_id, match.player2_id)}
+    return on_board, [(match, match.player1_id not in busy and match.player2_id not in busy) for match in waiting]
+
+def start_group_knockout(tournament_id):
+    """
+    Creates the knockout stage of a groups tournament as soon as every group match has a
+    result: the best group_advance players of every group, seeded by seed_group_qualifiers,
+    in a bracket built by build_knockout_bracket and stored with one bulk insert.
+    Runs inside the transaction of the score change (which holds the write lock), so the
+    pre-assigned IDs cannot be taken concurrently. Does not commit.
+    Returns the IDs of the new matches, empty if the group stage is not finished yet.
+    """
+    tournament = Tournament.query.get(tournament_id)
+    if tournament is None or tournament.mode != 'groups':
+        return []
+    total, completed = db.session.query(Tournament.total_matches, Tournament.completed_matches).filter_by(id=tournament_id).one()
+    if completed < total or Match.query.filter_by(tournament_id=tournament_id, group_number=None).first() is not None:
+        return []
+
+    players = Player.query.filter_by(tournament_id=tournament_id).all()
+    group_matches = db.session.query(Match.id, Match.player1_id, Match.player2_id, Match.score_player1,
+                                     Match.score_player2, Match.completed, Match.group_number).filter(
+        Match.tournament_id == tournament_id, Match.group_number != None).all()
+    tables = {}
+    for player in players:
+        tables.setdefault(player.group_number, [])
+    for number in tables:
+        tables[number] = compute_group_table([p for p in players if p.group_number == number],
+                                             [m for m in group_matches if m.group_number == number])
+    qualifiers = seed_group_qualifiers(dict(sorted(tables.items())), tournament.group_advance or 1)
+    if len(qualifiers) < 2:
+        return []
+
+    first_round = current_round(tournament_id) + 1
+    first_id = (db.session.query(func.max(Match.id)).scalar() or 0) + 1
+    rows = build_knockout_bracket(tournament_id, qualifiers, first_id, first_round=first_round)
+    # Referenced matches (later rounds) first, in case foreign keys are enforced
+    db.session.execute(insert(Match), rows[::-1])
+
+    # Every match that already has both players is an open match for them
+    open_ids = [row[key] for row in rows if row['player1_id'] and row['player2_id'] and not row['completed']
+                for key in ('player1_id', 'player2_id')]
+    if open_ids:
+        Standing.query.filter(Standing.tournament_id == tournament_id, Standing.player_id.in_(open_ids)).update(
+            {Standing.open_matches: Standing.open_matches + 1}, synchronize_session=False)
+    adjust_total_matches(tournament_id, sum(1 for row in rows if not row['is_bye']))
+    return [row['id'] for row in rows]
+
+class HeadToHead:
+    """
+    Head-to-head results of all player pairs, built once per standings computation.
+    Answers mini-league queries for any subset of k players in O(k^2) without
+    rescanning the match list.
+    """
+
+    def __init__(self, matches):
+        # (player_id, opponent_id) -> [points, legs_won, legs_lost] from player_id's point of view
+        self._results = {}
+        for match in matches:
+            if not match.completed or not match.player1_id or not match.player2_id:
+                continue
+            p1, p2 = match.player1_id, match.player2_id
+            s1, s2 = match.score_player1, match.score_player2
             if s1 > s2:
-                mini_stats[p1]['mini_points'] += 2
+                points1, points2 = 2, 0
             elif s2 > s1:
-                mini_stats[p2]['mini_points'] += 2
+                points1, points2 = 0, 2
             else:
-                mini_stats[p1]['mini_points'] += 1
-                mini_stats[p2]['mini_points'] += 1
-    return mini_stats
+                points1, points2 = 1, 1
+            self._add(p1, p2, points1, s1, s2)
+            self._add(p2, p1, points2, s2, s1)
+
+    def _add(self, player_id, opponent_id, points, legs_won, legs_lost):
+        entry = self._results.setdefault((player_id, opponent_id), [0, 0, 0])
+        entry[0] += points
+        entry[1] += legs_won
+        entry[2] += legs_lost
+
+    def mini_league(self, player_ids):
+        """
+        Stats considering ONLY matches between the given players.
+        Returns a dict: {player_id: {'mini_points': x, 'mini_diff': y, 'mini_legs_won': z}}
+        """
+        player_ids = list(player_ids)
+        mini_stats = {}
+        for pid in player_ids:
+            points = legs_won = legs_lost = 0
+            for opponent_id in player_ids:
+                entry = self._results.get((pid, opponent_id))
+                if entry:
+                    points += entry[0]
+                    legs_won += entry[1]
+                    legs_lost += entry[2]
+            mini_stats[pid] = {'mini_points': points, 'mini_diff': legs_won - legs_lost, 'mini_legs_won': legs_won}
+        return mini_stats
+
+def calculate_mini_league(matches, tied_players_ids):
+    """
+    Calculates stats considering ONLY matches between the players in tied_players_ids.
+    Returns a dict: {player_id: {'mini_points': x, 'mini_diff': y, 'mini_legs_won': z}}
+    """
+    return HeadToHead(matches).mini_league(tied_players_ids)
+
+def _break_tie(group, head_to_head):
+    """
+    Orders a group of players that are level on points.
+    Criteria: mini-league points, mini-league leg difference, overall leg difference,
+    overall legs won. Players still level after the mini-league form a smaller group,
+    for which the mini-league is applied again with only their mutual matches.
+    """
+    mini_results = head_to_head.mini_league(p['player'].id for p in group)
+
+    def mini_key(p_stat):
+        mini = mini_results[p_stat['player'].id]
+        return (mini['mini_points'], mini['mini_diff'])
+
+    def full_key(p_stat):
+        # Overall stats only decide if the mini-league cannot separate the players
+        return mini_key(p_stat) + (p_stat['legs_won'] - p_stat['legs_lost'], p_stat['legs_won'])
 
-def sort_standings(player_stats, matches):
+    group = sorted(group, key=full_key, reverse=True)
+
+    ordered = []
+    for _, sub_group in itertools.groupby(group, key=mini_key):
+        sub_group = list(sub_group)
+        if 1 < len(sub_group) < len(group):
+            # Some players were separated, re-apply the mini-league to the ones still level
+            ordered.extend(_break_tie(sub_group, head_to_head))
+        else:
+            ordered.extend(sub_group)
+    return ordered
+
+def sort_standings(player_stats, matches, head_to_head=None):
     # 1. Initial sort by Total Points
     # We group players by points to identify ties.
     standings = list(player_stats.values())
@@ -229,7 +1099,6 @@ def sort_standings(player_stats, matches):
     final_standings = []
     
     # Process groups of players with the same points
-    import itertools
     for points, group in itertools.groupby(standings, key=lambda x: x['points']):
         group_list = list(group)
         
@@ -237,30 +1106,149 @@ def sort_standings(player_stats, matches):
             # No tie, just add to final standings
             final_standings.extend(group_list)
         else:
-            # Tie detected! Apply Mini-League logic.
-            tied_ids = {p['player'].id for p in group_list}
-            mini_results = calculate_mini_league(matches, tied_ids)
+            # Tie detected! Apply Mini-League logic, the head-to-head index is built only once.
+            if head_to_head is None:
+                head_to_head = HeadToHead(matches)
+            final_standings.extend(_break_tie(group_list, head_to_head))
             
-            # Sort the tied group based on specific criteria hierarchy
-            def tie_breaker_key(p_stat):
-                pid = p_stat['player'].id
-                mini = mini_results[pid]
-                
-                # Criteria 1: Mini-League Points (desc)
-                c1 = mini['mini_points']
-                
-                # Criteria 2: Mini-League Leg Difference (desc)
-                c2 = mini['mini_diff']
-                
-                # Criteria 3: Overall Leg Difference (desc) - Fallback to global stats
-                c3 = p_stat['legs_won'] - p_stat['legs_lost']
-                
-                # Criteria 4: Overall Legs Won (desc)
-                c4 = p_stat['legs_won']
-                
-                return (c1, c2, c3, c4)
+    return final_standings
+
+def winner_and_loser(match):
+    """(winner_id, loser_id) of a completed match between two players, (None, None) otherwise."""
+    if not match.completed or not match.player1_id or not match.player2_id:
+        return None, None
+    if match.score_player1 > match.score_player2:
+        return match.player1_id, match.player2_id
+    if match.score_player2 > match.score_player1:
+        return match.player2_id, match.player1_id
+    return None, None
+
+def rank_double_elimination(player_stats, matches):
+    """
+    Ranks a double elimination tournament: champion and runner-up from the deciding final,
+    then the other players by how late they were knocked out of the losers bracket,
+    players still in the race first. Ties are ordered by wins.
+    """
+    ranked_ids = []
+    grand_final = next((m for m in matches if m.bracket == 'G'), None)
+    reset = next((m for m in matches if m.bracket == 'R'), None)
+    if reset is not None and not reset.is_bye and reset.completed:
+        decider = reset
+    elif grand_final is not None and winner_and_loser(grand_final)[0] is not None and (
+            reset is None or winner_and_loser(grand_final)[0] == grand_final.player1_id):
+        # Without a reset match the grand final always decides
+        decider = grand_final
+    else:
+        decider = None
+    if decider is not None:
+        ranked_ids.extend(winner_and_loser(decider))
+
+    # Losing in the losers bracket knocks a player out, later rounds rank higher
+    knocked_out = {}
+    for m in matches:
+        if m.bracket == 'L':
+            loser_id = winner_and_loser(m)[1]
+            if loser_id:
+                knocked_out[loser_id] = m.round_number
+
+    rest_ids = [pid for pid in player_stats if pid not in ranked_ids]
+    rest_ids.sort(key=lambda pid: (pid not in knocked_out, knocked_out.get(pid, 0), player_stats[pid]['wins']), reverse=True)
+    return [player_stats[pid] for pid in ranked_ids if pid in player_stats] + [player_stats[pid] for pid in rest_ids]
+
+def rank_groups(player_stats, matches, tables=None):
+    """
+    Ranks a groups tournament: the players of the knockout stage as in knockout mode,
+    then all others by their position in the group, points and legs.
+    tables are the group tables if already computed (see group_tables).
+    """
+    knockout_matches = [m for m in matches if m.group_number is None]
+    knockout_ids = {pid for m in knockout_matches for pid in (m.player1_id, m.player2_id) if pid}
+    ranked = []
+    if knockout_matches:
+        ranked = rank_standings('knockout', {pid: player_stats[pid] for pid in player_stats if pid in knockout_ids},
+                                knockout_matches)
+
+    if tables is None:
+        tournament_id = matches[0].tournament_id if matches else None
+        tables = group_tables(tournament_id, [row['player'] for row in player_stats.values()], matches)
+    position = {}
+    group_stats = {}
+    for table in tables.values():
+        for index, row in enumerate(table):
+            position[row['player'].id] = index
+            group_stats[row['player'].id] = row
+    rest = [pid for pid in player_stats if pid not in knockout_ids]
+    rest.sort(key=lambda pid: (position.get(pid, len(player_stats)),
+                               tuple(-value for value in _stats_key(group_stats.get(pid, player_stats[pid])))))
+    return ranked + [player_stats[pid] for pid in rest]
+
+def rank_standings(mode, player_stats, matches):
+    """
+    Orders the standings of a tournament according to its mode.
+    Round robin and Swiss use sort_standings, knockout ranks by the final and the 3rd place match.
+    Groups rank the knockout stage first, then everybody else by group position.
+    """
+    if mode in ('round_robin', 'swiss'):
+        return sort_standings(player_stats, matches)
+    if mode == 'double_elimination':
+        return rank_double_elimination(player_stats, matches)
+    if mode == 'groups':
+        return rank_groups(player_stats, matches)
+
+    # KO: Rank by specific achievements
+    # 1. Winner of Final
+    # 2. Loser of Final
+    # 3. Winner of 3rd Place Match
+    # 4. Loser of 3rd Place Match
+    # 5+. Sort by wins
+    
+    # Identify specific matches
+    final_match = None
+    third_place_match = None
+    
+    # Max round number logic is brittle if we just take max(round_number) because 3rd place is also max.
+    # But we added is_third_place flag.
+    
+    # Find max round number
+    max_round = 0
+    if matches:
+        max_round = max(m.round_number for m in matches)
+        
+    for m in matches:
+        if m.round_number == max_round:
+            if m.is_third_place:
+                third_place_match = m
+            else:
+                final_match = m
+    
+    # Assign ranks
+    ranked_ids = []
+    
+    if final_match and final_match.completed:
+        if final_match.score_player1 > final_match.score_player2:
+            ranked_ids.append(final_match.player1_id) # 1st
+            ranked_ids.append(final_match.player2_id) # 2nd
+        else:
+            ranked_ids.append(final_match.player2_id) # 1st
+            ranked_ids.append(final_match.player1_id) # 2nd
             
-            group_list.sort(key=tie_breaker_key, reverse=True)
-            final_standings.extend(group_list)
+    if third_place_match and third_place_match.completed:
+        if third_place_match.score_player1 > third_place_match.score_player2:
+            ranked_ids.append(third_place_match.player1_id) # 3rd
+            ranked_ids.append(third_place_match.player2_id) # 4th
+        else:
+            ranked_ids.append(third_place_match.player2_id) # 3rd
+            ranked_ids.append(third_place_match.player1_id) # 4th
+    
+    # Build the final sorted list
+    # Start with the specifically ranked players
+    ko_standings = []
+    for pid in ranked_ids:
+        if pid in player_stats:
+            ko_standings.append(player_stats[pid])
             
-    return final_standings
+    # Add the rest, sorted by wins
+    rest_of_players = [p for pid, p in player_stats.items() if pid not in ranked_ids]
+    rest_of_players.sort(key=lambda x: x['wins'], reverse=True)
+    
+    return ko_standings + rest_of_players